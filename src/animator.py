@@ -1,35 +1,122 @@
+import bisect
 import json
+from typing import NamedTuple
+
 import numpy as np
-from scipy.interpolate import interp1d
-from scipy.spatial.transform import Rotation as R, Slerp
+from scipy.interpolate import PchipInterpolator
+from scipy.spatial.transform import Rotation as R
+
+import interpolation
+
+
+INTERPOLATION_METHODS = ["linear", "cubic", "zero", "slinear", "quadratic", "catmull_rom", "hermite", "ease"]
+
+# 各插值方法对应的基座旋转插值方式: 原有方法保持逐段 Slerp，新增的平滑方法使用 SQUAD
+ROTATION_MODES = {"catmull_rom": "squad", "hermite": "squad", "ease": "squad"}
+
+# 基座位置在通道张量中的通道名 (位于所有关节之后)，也用作 "tangents" 中的键
+BASE_CHANNELS = ["base_x", "base_y", "base_z"]
+
+# 缓动函数: u in [0, 1] -> [0, 1]
+EASE_FUNCTIONS = {
+    "in": lambda u: u * u,
+    "out": lambda u: 1.0 - (1.0 - u) ** 2,
+    "in_out": lambda u: u * u * (3.0 - 2.0 * u),
+}
+
+
+class ClipSamples(NamedTuple):
+    """批量采样结果，每一行对应一个采样时刻。"""
+
+    joint_names: list  # (J,)
+    joints: np.ndarray  # (T, J)
+    base_pos: np.ndarray  # (T, 3)
+    base_rot: R  # 长度为 T 的 Rotation
 
 
 class Animator:
+    # 时间扭曲曲线的采样密度 (spline / ease 会被离散成查找表)
+    WARP_RESOLUTION = 512
+
     def __init__(self):
         # 关键帧列表: [{"time": t, "pose": {...}, "base": {"pos": [x,y,z], "rpy": [r,p,y]}}, ...]
+        # hermite 插值时关键帧可带 "tangents": {通道名: [入切线, 出切线]}，通道名为关节名或 base_x/y/z，
+        # 缺省的通道使用 Catmull-Rom 切线
+        # 每个关键帧带一个稳定的 "id"，在修改时间、排序和增删其他关键帧后保持不变
         self.keyframes = []
         self.duration = 2.0
-        self.interpolators = {}
+        # (关节名, 关节+基座位置 的分段多项式, 基座旋转曲线)，由同一份关键帧构建并整体替换，
+        # 其他线程读取时不会看到半更新状态，关节名也总与曲线的列对应
+        self.curves = None
         self.needs_update = False
-        self.interpolation_method = "linear"  # linear, cubic, zero, slinear, quadratic
+        self.interpolation_method = "linear"  # 见 INTERPOLATION_METHODS
+        # 播放时间 -> 源时间 的反向查找表 (playback_times, source_times)，None 表示不扭曲
+        self.time_warp = None
+
+    @property
+    def joint_names(self):
+        return list(self.keyframes[0]["pose"].keys()) if self.keyframes else []
 
     def set_interpolation_method(self, method):
-        if method in ["linear", "cubic", "zero", "slinear", "quadratic"]:
+        if method in INTERPOLATION_METHODS:
             self.interpolation_method = method
             self.needs_update = True
 
+    def keyframe_ids(self):
+        """按时间顺序返回所有关键帧的 id，缺少 id 的关键帧 (旧文件或外部构造) 在此补上。"""
+        ids = [k.get("id") for k in self.keyframes]
+        if None in ids:
+            next_id = max((i for i in ids if i is not None), default=-1) + 1
+            for k, kid in zip(self.keyframes, ids):
+                if kid is None:
+                    k["id"] = next_id
+                    next_id += 1
+            ids = [k["id"] for k in self.keyframes]
+        return ids
+
+    def _next_keyframe_id(self):
+        return max(self.keyframe_ids(), default=-1) + 1
+
+    def find_keyframe(self, keyframe_id, hint=None):
+        """
+        id -> 当前下标，不存在时返回 None。
+        hint: 上次已知的下标，命中时为 O(1)，否则退回线性查找
+        """
+        if hint is not None and 0 <= hint < len(self.keyframes) and self.keyframes[hint].get("id") == keyframe_id:
+            return hint
+        return next((i for i, k in enumerate(self.keyframes) if k.get("id") == keyframe_id), None)
+
     def add_keyframe(self, time, pose, base_pos, base_rpy):
-        existing_idx = next((i for i, k in enumerate(self.keyframes) if np.isclose(k["time"], time)), None)
+        """插入关键帧 (与已有关键帧时间重合时覆盖它并沿用其 id)，返回关键帧 id。"""
+        # 关键帧按时间有序 (load_from_dict / _set_keyframe_times 负责排序)，二分定位后只需检查左右相邻的两个
+        idx = bisect.bisect_left(self.keyframes, time, key=lambda k: k["time"])
+        existing_idx = next(
+            (i for i in (idx - 1, idx) if 0 <= i < len(self.keyframes) and np.isclose(self.keyframes[i]["time"], time)),
+            None,
+        )
 
         frame_data = {"time": time, "pose": pose.copy(), "base": {"pos": list(base_pos), "rpy": list(base_rpy)}}
 
         if existing_idx is not None:
+            frame_data["id"] = self.keyframes[existing_idx].get("id", self._next_keyframe_id())
             self.keyframes[existing_idx] = frame_data
         else:
-            self.keyframes.append(frame_data)
-            self.keyframes.sort(key=lambda x: x["time"])
+            frame_data["id"] = self._next_keyframe_id()
+            self.keyframes.insert(idx, frame_data)
+
+        self.needs_update = True
+        return frame_data["id"]
 
+    def update_keyframe(self, keyframe_id, pose, base_pos, base_rpy):
+        """替换指定关键帧的姿态，时间和 id 不变。返回是否找到该关键帧。"""
+        idx = self.find_keyframe(keyframe_id)
+        if idx is None:
+            return False
+        k = self.keyframes[idx]
+        k["pose"] = pose.copy()
+        k["base"] = {"pos": list(base_pos), "rpy": list(base_rpy)}
         self.needs_update = True
+        return True
 
     def remove_keyframe(self, index):
         if 0 <= index < len(self.keyframes):
@@ -38,42 +125,161 @@ class Animator:
 
     def clear_keyframes(self):
         self.keyframes = []
+        self.time_warp = None
+        self.needs_update = True
+
+    def _keyframe_times(self):
+        return np.array([k["time"] for k in self.keyframes], dtype=float)
+
+    def _set_keyframe_times(self, times):
+        for k, t in zip(self.keyframes, np.asarray(times, dtype=float).tolist()):
+            k["time"] = t
+        self.keyframes.sort(key=lambda x: x["time"])
         self.needs_update = True
 
+    def _warp_table(self):
+        """当前的反向时间表；未设置扭曲时返回覆盖整个片段的恒等映射。"""
+        if self.time_warp is not None:
+            return self.time_warp
+        lo, hi = 0.0, self.duration
+        if self.keyframes:
+            lo = min(lo, self.keyframes[0]["time"])
+            hi = max(hi, self.keyframes[-1]["time"])
+        identity = np.array([lo, hi], dtype=float)
+        return identity, identity.copy()
+
+    def scale_to_duration(self, duration):
+        """将所有关键帧 (以及已有的时间扭曲) 均匀缩放到目标时长。"""
+        if duration <= 0:
+            raise ValueError(f"Duration must be positive, got {duration}")
+        factor = duration / self.duration
+        if self.keyframes:
+            self._set_keyframe_times(self._keyframe_times() * factor)
+        if self.time_warp is not None:
+            play, src = self.time_warp
+            self.time_warp = (play * factor, src * factor)
+        self.duration = duration
+
+    def set_time_warp(self, source_times, playback_times, kind="linear"):
+        """
+        设置时间扭曲曲线: 源时间 source_times[i] 在播放时出现于 playback_times[i]。
+        kind: "linear" (分段线性) 或 "spline" (单调三次样条，不会过冲)
+        duration 是播放时长，随新的映射一起更新，使片段的源时间终点仍在播放终点处。
+        """
+        src = np.asarray(source_times, dtype=float)
+        play = np.asarray(playback_times, dtype=float)
+        if src.shape != play.shape or src.ndim != 1 or len(src) < 2:
+            raise ValueError("Time warp needs two matching 1D arrays with at least 2 knots")
+        if np.any(np.diff(src) <= 0) or np.any(np.diff(play) <= 0):
+            raise ValueError("Time warp knots must be strictly increasing")
+        if kind not in ("linear", "spline"):
+            raise ValueError(f"Unknown time warp kind: {kind}")
+
+        source_end = self.warp_time(self.duration)
+        if kind == "linear":
+            self.time_warp = (play, src)
+        elif kind == "spline":
+            grid = np.linspace(src[0], src[-1], self.WARP_RESOLUTION)
+            self.time_warp = (PchipInterpolator(src, play)(grid), grid)
+        self.duration = float(self.unwarp_time(source_end))
+
+    def ease_segment(self, t_start, t_end, mode="in_out"):
+        """在播放时间区间 [t_start, t_end] 上叠加缓入/缓出，区间端点保持不动。"""
+        if mode not in EASE_FUNCTIONS:
+            raise ValueError(f"Unknown ease mode: {mode}")
+        if t_end <= t_start:
+            raise ValueError("Ease segment must have t_end > t_start")
+
+        play, src = self._warp_table()
+        if self.time_warp is None and t_end > play[-1]:
+            play = src = np.array([play[0], t_end])
+
+        # 新映射: p -> old_inverse(ease(p))
+        grid = np.union1d(play, np.linspace(t_start, t_end, self.WARP_RESOLUTION))
+        u = np.clip((grid - t_start) / (t_end - t_start), 0.0, 1.0)
+        inside = (grid > t_start) & (grid < t_end)
+        eased = np.where(inside, t_start + (t_end - t_start) * EASE_FUNCTIONS[mode](u), grid)
+        self.time_warp = (grid, np.interp(eased, play, src))
+
+    def clear_time_warp(self):
+        """清除时间扭曲，播放时长恢复为源时长。"""
+        if self.time_warp is not None:
+            self.duration = float(self.warp_time(self.duration))
+        self.time_warp = None
+
+    def warp_time(self, time):
+        """播放时间 -> 源时间 (支持标量或数组)。"""
+        if self.time_warp is None:
+            return time
+        play, src = self.time_warp
+        return np.interp(time, play, src)
+
+    def unwarp_time(self, time):
+        """源时间 -> 播放时间，即 warp_time 的逆映射。"""
+        if self.time_warp is None:
+            return time
+        play, src = self.time_warp
+        return np.interp(time, src, play)
+
+    def bake_time_warp(self):
+        """
+        把时间扭曲写回关键帧时间并清除扭曲。关键帧随之变为播放时间，duration 本就是播放时长，保持不变。
+        注意：只移动关键帧，关键帧之间的缓动细节会由插值重新生成。
+        """
+        if self.time_warp is None:
+            return
+        if self.keyframes:
+            self._set_keyframe_times(self.unwarp_time(self._keyframe_times()))
+        self.time_warp = None
+
+    def _keyframe_tangents(self, keyframes, times, values, channel_names):
+        tangents = interpolation.catmull_rom_tangents(times, values)
+        tangents_in, tangents_out = tangents, tangents.copy()
+        for i, k in enumerate(keyframes):
+            for name, tangent in k.get("tangents", {}).items():
+                if name not in channel_names:
+                    continue
+                c = channel_names.index(name)
+                t_in, t_out = tangent if isinstance(tangent, (list, tuple)) else (tangent, tangent)
+                tangents_in[i, c] = t_in
+                tangents_out[i, c] = t_out
+        return tangents_in, tangents_out
+
     def _update_interpolators(self):
-        if len(self.keyframes) < 2:
-            self.interpolators = {}
+        # 先清除标记再读取关键帧: 构建期间 (其他线程) 的修改会重新置位，下次采样时再次重建而不会丢失
+        self.needs_update = False
+        keyframes = list(self.keyframes)
+        if len(keyframes) < 2:
+            self.curves = None
             return
 
-        times = [k["time"] for k in self.keyframes]
-
-        # 1. Joint Interpolation
-        joint_names = self.keyframes[0]["pose"].keys()
-        self.interpolators["joints"] = {}
-        for name in joint_names:
-            values = [k["pose"][name] for k in self.keyframes]
-            self.interpolators["joints"][name] = interp1d(
-                times, values, kind=self.interpolation_method, fill_value="extrapolate"
-            )
-
-        # 2. Base Position Interpolation
-        base_pos_list = [k["base"]["pos"] for k in self.keyframes]
-        base_pos_arr = np.array(base_pos_list)  # (N, 3)
-        # interp1d expects x to be 1D, y to be (..., N) if axis is not default
-        # But here y is (N, 3). axis=0 means interpolation along the first axis (time).
-        # Wait, interp1d(x, y, axis=0) means x corresponds to the first axis of y.
-        # Correct.
-        self.interpolators["base_pos"] = interp1d(
-            times, base_pos_arr, axis=0, kind=self.interpolation_method, fill_value="extrapolate"
-        )
+        # 关节 + 基座位置 放进同一个 (K, C) 矩阵，由一个分段多项式统一求值
+        times = np.array([k["time"] for k in keyframes], dtype=float)
+        joint_names = list(keyframes[0]["pose"].keys())
+        values = np.array([[k["pose"][name] for name in joint_names] + list(k["base"]["pos"]) for k in keyframes])
 
-        # 3. Base Rotation Interpolation (Slerp)
-        # Convert RPY to Quaternions
-        base_rpy_list = [k["base"]["rpy"] for k in self.keyframes]
-        rotations = R.from_euler("xyz", base_rpy_list, degrees=False)
-        self.interpolators["base_rot"] = Slerp(times, rotations)
+        method = self.interpolation_method
+        if method == "zero":
+            curve = interpolation.constant(times, values)
+        elif method in ("linear", "slinear"):
+            curve = interpolation.linear(times, values)
+        elif method == "quadratic":
+            curve = interpolation.spline(times, values, k=2)
+        elif method == "cubic":
+            curve = interpolation.spline(times, values, k=3)
+        elif method == "catmull_rom":
+            curve = interpolation.catmull_rom(times, values)
+        elif method == "hermite":
+            tangents_in, tangents_out = self._keyframe_tangents(keyframes, times, values, joint_names + BASE_CHANNELS)
+            curve = interpolation.hermite(times, values, tangents_in, tangents_out)
+        else:  # ease
+            curve = interpolation.ease(times, values)
 
-        self.needs_update = False
+        # 基座旋转: 阶梯 / Slerp / SQUAD
+        quats = R.from_euler("xyz", [k["base"]["rpy"] for k in keyframes], degrees=False).as_quat()
+        rotation_curve = interpolation.QuaternionCurve(times, quats, mode=ROTATION_MODES.get(method, "slerp"))
+
+        self.curves = (joint_names, curve, rotation_curve)
 
     def get_state_at_time(self, time):
         """
@@ -86,41 +292,67 @@ class Animator:
             k = self.keyframes[0]
             return k["pose"], k["base"]["pos"], k["base"]["rpy"]
 
-        if self.needs_update:
-            self._update_interpolators()
+        s = self.sample([time])
+        pose = dict(zip(s.joint_names, s.joints[0].tolist()))
+        return pose, s.base_pos[0].tolist(), s.base_rot[0].as_euler("xyz", degrees=False).tolist()
 
-        # Clamp time for Slerp (it doesn't support extrapolation well by default)
-        # Ensure times are numpy array for clip
-        times_arr = np.array([k["time"] for k in self.keyframes])
-        t_clamped = np.clip(time, times_arr[0], times_arr[-1])
-
-        # Joints
-        pose = {}
-        for name, func in self.interpolators["joints"].items():
-            pose[name] = float(func(time))  # interp1d handles extrapolation
+    def sample(self, times):
+        """
+        一次性批量采样多个 (播放) 时刻。
+        Returns: ClipSamples
+        """
+        times = np.atleast_1d(np.asarray(times, dtype=float))
+        n = len(times)
 
-        # Base Pos
-        base_pos = self.interpolators["base_pos"](time).tolist()
+        # 流式发送线程会与 GUI 的编辑并发调用 sample: 关键帧列表和曲线各只读取一次，之后只用局部变量
+        keyframes = self.keyframes
+        if len(keyframes) >= 2 and (self.needs_update or self.curves is None):
+            self._update_interpolators()
+        curves = self.curves
 
-        # Base Rot
-        base_rot = self.interpolators["base_rot"](t_clamped)
-        base_rpy = base_rot.as_euler("xyz", degrees=False).tolist()
+        if curves is None or len(keyframes) < 2:
+            first = keyframes[:1]  # 切片是原子操作，列表被并发清空时得到空列表
+            if not first:
+                return ClipSamples([], np.zeros((n, 0)), np.zeros((n, 3)), R.identity(n))
+            k = first[0]
+            names = list(k["pose"].keys())
+            joints = np.tile(np.array([k["pose"][name] for name in names], dtype=float), (n, 1))
+            base_pos = np.tile(np.array(k["base"]["pos"], dtype=float), (n, 1))
+            base_rot = R.from_euler("xyz", np.tile(k["base"]["rpy"], (n, 1)), degrees=False)
+            return ClipSamples(names, joints, base_pos, base_rot)
 
-        return pose, base_pos, base_rpy
+        names, curve, rotation_curve = curves
+        src = np.asarray(self.warp_time(times), dtype=float)
+        values = curve(src)  # (T, J + 3)
+        return ClipSamples(names, values[:, :-3], values[:, -3:], R.from_quat(rotation_curve(src)))
 
-    def save_to_file(self, filename):
+    def to_dict(self):
         data = {
             "duration": self.duration,
             "interpolation_method": self.interpolation_method,
             "keyframes": self.keyframes,
         }
-        with open(filename, "w") as f:
-            json.dump(data, f, indent=2)
+        if self.time_warp is not None:
+            play, src = self.time_warp
+            data["time_warp"] = {"playback": play.tolist(), "source": src.tolist()}
+        return data
 
-    def load_from_file(self, filename):
-        with open(filename, "r") as f:
-            data = json.load(f)
+    def load_from_dict(self, data):
         self.duration = data.get("duration", 2.0)
         self.interpolation_method = data.get("interpolation_method", "linear")
-        self.keyframes = data.get("keyframes", [])
+        # 插值和二分查找都假定关键帧按时间有序，文件中的顺序不可信
+        self.keyframes = sorted(data.get("keyframes", []), key=lambda k: k["time"])
+        self.keyframe_ids()  # 旧文件没有 id，载入时一次补齐
+        self.time_warp = None
+        if "time_warp" in data:
+            warp = data["time_warp"]
+            self.time_warp = (np.array(warp["playback"], dtype=float), np.array(warp["source"], dtype=float))
         self.needs_update = True
+
+    def save_to_file(self, filename):
+        with open(filename, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def load_from_file(self, filename):
+        with open(filename, "r") as f:
+            self.load_from_dict(json.load(f))
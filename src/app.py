@@ -7,6 +7,12 @@ from omegaconf import DictConfig
 from robot import Robot
 from animator import Animator
 from gui import GUI
+from streamer import PoseStreamer
+from state import StateStore
+from scene import ViserSceneBackend
+from contact import GROUND_HEIGHT
+from library import AnimationLibrary
+from pose_service import PoseService
 
 
 class RobotAnimatorApp:
@@ -14,39 +20,62 @@ class RobotAnimatorApp:
         self.cfg = cfg
         self.server = viser.ViserServer(label="Robot Animator")
         self.server.gui.configure_theme(control_width="large")
+        self.scene = ViserSceneBackend(self.server)
 
         self._setup_css()
         self._setup_scene()
 
         # 1. 初始化机器人
-        self.robot = Robot(self.server, cfg.robot)
+        self.robot = Robot(self.scene, cfg.robot)
         self.robot.setup()
 
         # 1.1 初始化 Ghost 机器人
-        self.ghost_robot = Robot(self.server, cfg.robot, name="/ghost", opacity=0.5, use_urdf=True)
+        self.ghost_robot = Robot(self.scene, cfg.robot, name="/ghost", opacity=0.5, use_urdf=True)
         self.ghost_robot.setup()
-        self.ghost_robot.base.visible = False
-        for joint in self.ghost_robot.joints.values():
-            joint.visible = False
+        self.ghost_robot.set_visible(False)
 
         # 2. 初始化动画器
         self.animator = Animator()
 
-        # 初始姿态
-        self.current_pose = self.robot.get_default_pose()
-        self.current_base_pos = [0.0, 0.0, 0.4]
-        self.current_base_rpy = [0.0, 0.0, 0.0]
+        # 3. 应用状态 (初始姿态 + 播放状态)
+        # viser 回调在服务器线程上发布修改，主循环读取不可变快照并负责渲染主机器人
+        self.state = StateStore(
+            self.robot.get_default_pose(),
+            base_pos=(0.0, 0.0, 0.4),
+            base_rpy=(0.0, 0.0, 0.0),
+            tick_time=time.time(),
+        )
+        snap = self.state.snapshot()
+        self.robot.update_pose(snap.pose)
+        self.robot.update_base(snap.base_pos, snap.base_rpy)
+
+        # 4. 关节目标流输出 (独立线程)
+        stream_cfg = cfg.stream
+        address = (stream_cfg.host, stream_cfg.port) if stream_cfg.transport == "udp" else stream_cfg.path
+        self.streamer = PoseStreamer(
+            lambda t: self.animator.sample([t]),
+            self.get_playback_time,
+            address,
+            transport=stream_cfg.transport,
+            rate=stream_cfg.rate,
+        )
 
-        self.robot.update_pose(self.current_pose)
-        self.robot.update_base(self.current_base_pos, self.current_base_rpy)
+        # 5. 动画库索引 (在 GUI 中刷新，避免启动时扫描大目录)
+        self.library = AnimationLibrary(cfg.library.root, cfg.library.index)
 
-        # 3. GUI 状态
-        self.gui_state = {"playing": False, "time": 0.0, "speed": 1.0, "loop": True, "duration": 2.0}
+        # 5.1 批量姿态查询服务 (与 viser 同进程，共用动画库索引)
+        service_cfg = cfg.service
+        self.pose_service = PoseService(self.library, service_cfg.host, service_cfg.port, service_cfg.cache_size)
 
-        # 4. 构建 GUI
+        # 6. 构建 GUI
         self.gui = GUI(self)
         self.gui.setup()
 
+        if stream_cfg.enabled:
+            self.streamer.start()
+        if service_cfg.enabled:
+            self.pose_service.start()
+
     def _setup_css(self):
         self.server.gui.add_html(
             """
@@ -63,56 +92,75 @@ class RobotAnimatorApp:
         )
 
     def _setup_scene(self):
-        self.server.scene.add_grid("ground_grid", width=20, height=20, cell_size=0.5)
-        self.server.scene.add_box(
+        self.scene.add_grid("ground_grid", width=20, height=20, cell_size=0.5)
+        # 地面的上表面位于 contact.GROUND_HEIGHT，与接触分析使用同一高度
+        thickness = 0.01
+        self.scene.add_box(
             "ground_plane",
-            dimensions=(20, 20, 0.01),
-            position=(0, 0, -0.005),
+            dimensions=(20, 20, thickness),
+            position=(0, 0, GROUND_HEIGHT - thickness / 2),
             color=(0.95, 0.95, 0.95),
         )
 
+    def get_playback_time(self, snap=None):
+        """
+        当前播放时间，由快照中的 time 按 tick_time 之后经过的墙钟时间外推，
+        因此任何线程 (如高频流输出) 都能得到连续的时间而不必等待主循环推进。
+        """
+        snap = snap if snap is not None else self.state.snapshot()
+        t = snap.time
+        if not snap.playing:
+            return t
+        t += (time.time() - snap.tick_time) * snap.speed
+        if t > snap.duration:
+            t = t % snap.duration if snap.loop else snap.duration
+        return t
+
     def run(self):
-        last_time = time.time()
+        rendered_version = None
 
         # 初始更新一次 Ghost
-        self.gui.update_ghost_pose(self.gui_state["time"])
+        self.gui.update_ghost_pose(self.state.snapshot().time)
 
         while True:
             now = time.time()
-            dt = now - last_time
-            last_time = now
-
-            if self.gui_state["playing"]:
-                # 更新时间
-                self.gui_state["time"] += dt * self.gui_state["speed"]
-
-                # 循环处理
-                if self.gui_state["time"] > self.gui_state["duration"]:
-                    if self.gui_state["loop"]:
-                        self.gui_state["time"] %= self.gui_state["duration"]
-                    else:
-                        self.gui_state["time"] = self.gui_state["duration"]
-                        self.gui_state["playing"] = False
-                        self.gui.update_play_pause_buttons()
+            snap = self.state.snapshot()
+
+            if snap.playing:
+                # 更新时间 (含循环处理)
+                t = self.get_playback_time(snap)
+                finished = not snap.loop and t >= snap.duration
 
-                # 更新时间滑块
-                self.gui.update_time_slider(self.gui_state["time"])
+                changes = {"time": t, "tick_time": now}
+                if finished:
+                    changes["playing"] = False
 
-                # 计算并应用姿态
+                # 计算姿态
                 if self.animator.keyframes:
-                    pose, b_pos, b_rpy = self.animator.get_state_at_time(self.gui_state["time"])
-                    self.robot.update_pose(pose)
-                    self.robot.update_base(b_pos, b_rpy)
+                    pose, b_pos, b_rpy = self.animator.get_state_at_time(t)
+                    changes.update(pose=pose, base_pos=b_pos, base_rpy=b_rpy)
+
+                # 只有在这一帧期间没有回调发布修改时才提交，否则下一帧基于最新快照重算
+                published = self.state.update(expected_version=snap.version, **changes)
+                if published is not None:
+                    snap = published
+
+                    # 更新时间滑块
+                    self.gui.update_time_slider(t)
+                    if finished:
+                        self.gui.update_play_pause_buttons()
 
-                    # 更新 Ghost
-                    self.gui.update_ghost_pose(self.gui_state["time"])
+                    if self.animator.keyframes:
+                        # 更新 Ghost
+                        self.gui.update_ghost_pose(t)
 
-                    # 更新滑块显示
-                    self.gui.sync_sliders(pose, b_pos, b_rpy)
+                        # 更新滑块显示
+                        self.gui.sync_sliders(snap.pose, snap.base_pos, snap.base_rpy)
 
-                    # 同步内部状态
-                    self.current_pose.update(pose)
-                    self.current_base_pos[:] = b_pos
-                    self.current_base_rpy[:] = b_rpy
+            # 主机器人只在这里渲染，每帧读取同一个快照，不会出现半更新的姿态
+            if snap.version != rendered_version:
+                self.robot.update_pose(snap.pose)
+                self.robot.update_base(snap.base_pos, snap.base_rpy)
+                rendered_version = snap.version
 
             time.sleep(0.01)
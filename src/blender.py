@@ -0,0 +1,201 @@
+import numpy as np
+from scipy.spatial.transform import Rotation as R
+
+from animator import Animator, ClipSamples
+
+
+class ClipLayer:
+    """
+    混合栈中的一层。
+    mode: "blend" (按权重向该层过渡) 或 "additive" (叠加该层相对参考帧的偏移)
+    offset: 该层在合成时间轴上的起始时间
+    fade_in / fade_out: 起止处的权重渐变时长 (秒)
+    root_offset: (yaw, translation) 混合前施加到该层基座上的水平面变换 (绕 z 旋转 yaw 后平移)，
+        用于把该层的根轨迹接到其他片段之后；只对 blend 层生效
+    """
+
+    def __init__(
+        self,
+        animator,
+        mode="blend",
+        weight=1.0,
+        offset=0.0,
+        fade_in=0.0,
+        fade_out=0.0,
+        loop=False,
+        root_offset=None,
+    ):
+        if mode not in ("blend", "additive"):
+            raise ValueError(f"Unknown layer mode: {mode}")
+        self.animator = animator
+        self.mode = mode
+        self.weight = weight
+        self.offset = offset
+        self.fade_in = fade_in
+        self.fade_out = fade_out
+        self.loop = loop
+        self.root_offset = root_offset
+
+    @property
+    def start(self):
+        return self.offset
+
+    @property
+    def end(self):
+        return self.offset + self.animator.duration
+
+    def local_times(self, times):
+        t = times - self.offset
+        if self.loop and self.animator.duration > 0:
+            return np.mod(t, self.animator.duration)
+        return np.clip(t, 0.0, self.animator.duration)
+
+    def weights(self, times):
+        if self.fade_in > 0:
+            ramp_in = np.clip((times - self.start) / self.fade_in, 0.0, 1.0)
+        else:
+            ramp_in = (times >= self.start).astype(float)
+
+        if self.loop:
+            ramp_out = np.ones_like(times)
+        elif self.fade_out > 0:
+            ramp_out = np.clip((self.end - times) / self.fade_out, 0.0, 1.0)
+        else:
+            ramp_out = (times <= self.end).astype(float)
+
+        return self.weight * ramp_in * ramp_out
+
+    def apply_root_offset(self, samples):
+        if self.root_offset is None:
+            return samples
+        yaw, translation = self.root_offset
+        turn = R.from_euler("z", yaw)
+        base_pos = turn.apply(samples.base_pos) + np.asarray(translation, dtype=float)
+        return samples._replace(base_pos=base_pos, base_rot=turn * samples.base_rot)
+
+
+def align_root(target_pos, target_rot, source_pos, source_rot):
+    """
+    计算把 source 根姿态 (位置, 旋转) 在水平面内对齐到 target 的 root_offset:
+    航向角对齐、x / y 平移对齐，高度保持 source 自身的值。
+    """
+    yaw = target_rot.as_euler("xyz")[2] - source_rot.as_euler("xyz")[2]
+    translation = np.asarray(target_pos, dtype=float) - R.from_euler("z", yaw).apply(source_pos)
+    translation[2] = 0.0
+    return yaw, translation
+
+
+def _slerp_pairwise(rot_a, rot_b, w):
+    # 逐样本球面插值: rot_a * exp(w * log(rot_a^-1 * rot_b))，as_rotvec 总是取最短弧
+    delta = (rot_a.inv() * rot_b).as_rotvec()
+    return rot_a * R.from_rotvec(delta * w[:, None])
+
+
+class ClipBlender:
+    """
+    多片段分层求值: 第一层为基础层，其余层按顺序混合或叠加。
+    每层每次求值只调用一次 Animator.sample。
+    """
+
+    def __init__(self, layers=None):
+        self.layers = list(layers) if layers else []
+
+    def add_layer(self, layer):
+        self.layers.append(layer)
+        return layer
+
+    @property
+    def duration(self):
+        if not self.layers:
+            return 0.0
+        return max(layer.end for layer in self.layers)
+
+    def sample(self, times):
+        times = np.atleast_1d(np.asarray(times, dtype=float))
+        if not self.layers:
+            return ClipSamples([], np.zeros((len(times), 0)), np.zeros((len(times), 3)), R.identity(len(times)))
+
+        base_layer = self.layers[0]
+        base = base_layer.animator.sample(base_layer.local_times(times))
+        names = base.joint_names
+        joints = base.joints.copy()
+        base_pos = base.base_pos.copy()
+        base_rot = base.base_rot
+
+        for layer in self.layers[1:]:
+            w = layer.weights(times)
+            if not layer.animator.keyframes or not np.any(w > 0):
+                continue
+
+            s = layer.animator.sample(layer.local_times(times))
+            if layer.mode == "blend":
+                s = layer.apply_root_offset(s)
+            # 只混合两层共有的关节，其余关节保持下层结果
+            layer_index = {name: i for i, name in enumerate(s.joint_names)}
+            cols = np.array([i for i, name in enumerate(names) if name in layer_index], dtype=int)
+            src_cols = np.array([layer_index[names[i]] for i in cols], dtype=int)
+            layer_joints = s.joints[:, src_cols]
+
+            if layer.mode == "blend":
+                joints[:, cols] += w[:, None] * (layer_joints - joints[:, cols])
+                base_pos += w[:, None] * (s.base_pos - base_pos)
+                base_rot = _slerp_pairwise(base_rot, s.base_rot, w)
+            else:
+                # 以该层第一帧作为参考姿态，只叠加相对变化
+                ref = layer.animator.sample([0.0])
+                joints[:, cols] += w[:, None] * (layer_joints - ref.joints[:, src_cols])
+                base_pos += w[:, None] * (s.base_pos - ref.base_pos)
+                delta = (ref.base_rot.inv() * s.base_rot).as_rotvec()
+                base_rot = base_rot * R.from_rotvec(delta * w[:, None])
+
+        return ClipSamples(names, joints, base_pos, base_rot)
+
+    def get_state_at_time(self, time):
+        """
+        与 Animator.get_state_at_time 相同的接口，便于直接预览。
+        Returns: (pose_dict, base_pos, base_rpy)
+        """
+        s = self.sample([time])
+        pose = {name: float(v) for name, v in zip(s.joint_names, s.joints[0])}
+        return pose, s.base_pos[0].tolist(), s.base_rot[0].as_euler("xyz", degrees=False).tolist()
+
+    def bake(self, fps=30.0, interpolation_method="linear"):
+        """按固定帧率把合成结果采样成新的 Animator。"""
+        duration = self.duration
+        n = max(int(np.ceil(duration * fps)) + 1, 2)
+        times = np.linspace(0.0, duration, n)
+        s = self.sample(times)
+        rpy = s.base_rot.as_euler("xyz", degrees=False)
+
+        animator = Animator()
+        animator.duration = duration
+        animator.interpolation_method = interpolation_method
+        animator.keyframes = [
+            {
+                "time": float(t),
+                "pose": dict(zip(s.joint_names, s.joints[i].tolist())),
+                "base": {"pos": s.base_pos[i].tolist(), "rpy": rpy[i].tolist()},
+            }
+            for i, t in enumerate(times)
+        ]
+        animator.needs_update = True
+        return animator
+
+
+def crossfade(clip_a, clip_b, overlap):
+    """
+    clip_a 结束前 overlap 秒开始淡入 clip_b。
+    clip_b 的根轨迹在水平面内对齐到 clip_a 在淡入起点的根姿态，
+    两段前进的片段可以首尾相接，不会在过渡期间停顿。
+    """
+    overlap = min(overlap, clip_a.duration, clip_b.duration)
+    start = clip_a.duration - overlap
+    a = clip_a.sample([start])
+    b = clip_b.sample([0.0])
+    root_offset = align_root(a.base_pos[0], a.base_rot[0], b.base_pos[0], b.base_rot[0])
+    return ClipBlender(
+        [
+            ClipLayer(clip_a),
+            ClipLayer(clip_b, offset=start, fade_in=overlap, root_offset=root_offset),
+        ]
+    )
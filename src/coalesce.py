@@ -0,0 +1,73 @@
+import threading
+import time
+
+from rich import print
+
+
+class CoalescingWorker:
+    """
+    最新请求优先的后台执行器。
+    submit() 只记录最近一次的参数并立即返回；工作线程每次取出最新的参数执行 fn，
+    执行期间到达的请求互相覆盖，因此积压的旧请求会被直接丢弃。两次执行之间至少间隔 min_interval 秒。
+    """
+
+    def __init__(self, fn, min_interval=0.0, name="coalescing-worker"):
+        self.fn = fn
+        self.min_interval = min_interval
+        self.name = name
+        self.submitted = 0
+        self.executed = 0
+
+        self._pending = None
+        self._has_pending = False
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, *args):
+        # 在锁内置位，保证工作线程取走请求时不会再收到这次提交迟到的唤醒
+        with self._lock:
+            self._pending = args
+            self._has_pending = True
+            self.submitted += 1
+            self._wakeup.set()
+
+    @property
+    def dropped(self):
+        """被后续请求覆盖而没有执行的请求数。"""
+        with self._lock:
+            return self.submitted - self.executed - int(self._has_pending)
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+        self._thread.join()
+
+    def _run(self):
+        last_run = 0.0
+        while True:
+            self._wakeup.wait()
+            if self._stop.is_set():
+                return
+
+            # 限速: 等待期间到达的请求会覆盖 _pending
+            delay = last_run + self.min_interval - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+            with self._lock:
+                self._wakeup.clear()
+                if not self._has_pending:
+                    continue
+                args = self._pending
+                self._pending = None
+                self._has_pending = False
+                self.executed += 1
+
+            last_run = time.perf_counter()
+            try:
+                self.fn(*args)
+            except Exception as e:
+                print(f"[red]{self.name} failed: {e}[/red]")
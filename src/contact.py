@@ -0,0 +1,154 @@
+from typing import NamedTuple
+
+import numpy as np
+
+from robot import FOOT_RADIUS, leg_mounts
+
+# 地面高度；RobotAnimatorApp._setup_scene 按它放置 ground_plane 的上表面
+GROUND_HEIGHT = 0.0
+
+# 叠加显示的颜色: 摆动 / 支撑 / 打滑 / 穿地
+OVERLAY_COLORS = {
+    "swing": (170, 170, 170),
+    "stance": (40, 180, 80),
+    "slip": (255, 150, 0),
+    "penetration": (220, 30, 30),
+}
+
+
+class FootReport(NamedTuple):
+    name: str
+    contacts: list  # [(t_start, t_end), ...] 支撑相
+    penetrations: list  # [(t_start, t_end, 最大穿地深度), ...]
+    slips: list  # [(t_start, t_end, 滑移距离), ...]
+    duty_factor: float  # 支撑时间占比
+
+
+class ContactReport(NamedTuple):
+    times: np.ndarray  # (T,)
+    feet_pos: np.ndarray  # (T, L, 3) 足端世界坐标
+    contact: np.ndarray  # (T, L) bool
+    penetration: np.ndarray  # (T, L) bool
+    slip: np.ndarray  # (T, L) bool
+    feet: list  # [FootReport, ...]
+
+
+def _rot_x(angle):
+    c, s = np.cos(angle), np.sin(angle)
+    zeros, ones = np.zeros_like(angle), np.ones_like(angle)
+    return np.stack([ones, zeros, zeros, zeros, c, -s, zeros, s, c], axis=-1).reshape(angle.shape + (3, 3))
+
+
+def _rot_y(angle):
+    c, s = np.cos(angle), np.sin(angle)
+    zeros, ones = np.zeros_like(angle), np.ones_like(angle)
+    return np.stack([c, zeros, s, zeros, ones, zeros, -s, zeros, c], axis=-1).reshape(angle.shape + (3, 3))
+
+
+def foot_positions(robot_cfg, samples):
+    """
+    按配置中的腿部几何 (与几何体模式的 Robot 相同的运动链) 批量计算足端世界坐标。
+    samples: Animator.sample 的结果
+    Returns: (leg_names, (T, L, 3))
+    """
+    mounts = leg_mounts(robot_cfg.body_dims)
+    names = [m["name"] for m in mounts]
+    index = {name: i for i, name in enumerate(samples.joint_names)}
+    n = len(samples.joints)
+
+    def angles(joint):
+        # (T, L)，缺失的关节按 0 处理
+        cols = [index.get(f"{leg}_{joint}") for leg in names]
+        return np.stack([samples.joints[:, c] if c is not None else np.zeros(n) for c in cols], axis=1)
+
+    hip, thigh, calf = angles("hip"), angles("thigh"), angles("calf")
+    mount_pos = np.array([m["pos"] for m in mounts], dtype=float)  # (L, 3)
+    sides = np.array([m["side"] for m in mounts], dtype=float)  # (L,)
+
+    # 从足端沿运动链往回变换: calf -> thigh -> hip -> base -> world
+    foot = np.array([0.0, 0.0, -robot_cfg.calf_len])
+    p = np.einsum("tlij,j->tli", _rot_y(calf), foot) + np.array([0.0, 0.0, -robot_cfg.thigh_len])
+    p = np.einsum("tlij,tlj->tli", _rot_y(thigh), p)
+    p[..., 1] += sides * robot_cfg.hip_len
+    p = np.einsum("tlij,tlj->tli", _rot_x(hip), p) + mount_pos
+
+    base_rot = samples.base_rot.as_matrix()  # (T, 3, 3)
+    world = np.einsum("tij,tlj->tli", base_rot, p) + samples.base_pos[:, None, :]
+    return names, world
+
+
+def _intervals(mask):
+    """布尔序列中每段连续 True 的 (起始下标, 结束下标)，结束下标包含在内。"""
+    edges = np.diff(np.concatenate([[0], mask.astype(np.int8), [0]]))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1) - 1
+    return list(zip(starts, ends))
+
+
+def analyze_contacts(
+    animator,
+    robot_cfg,
+    fps=200.0,
+    ground_height=GROUND_HEIGHT,
+    foot_radius=FOOT_RADIUS,
+    contact_tolerance=0.01,
+    penetration_tolerance=0.002,
+    slip_speed=0.05,
+):
+    """
+    对整个片段做一次批量采样，检测足端穿地、支撑相和支撑相内的水平滑移。
+    contact_tolerance: 足端离地 (扣除半径) 小于该值视为支撑
+    penetration_tolerance: 低于地面超过该值视为穿地
+    slip_speed: 支撑相内足端水平速度超过该值 (m/s) 视为打滑
+    """
+    n = max(int(np.ceil(animator.duration * fps)) + 1, 2)
+    times = np.linspace(0.0, animator.duration, n)
+    names, feet = foot_positions(robot_cfg, animator.sample(times))
+
+    clearance = feet[..., 2] - foot_radius - ground_height  # (T, L)
+    contact = clearance <= contact_tolerance
+    penetration = clearance < -penetration_tolerance
+
+    # 水平位移按相邻采样计算，记在后一个采样上
+    step = np.zeros(clearance.shape)
+    step[1:] = np.linalg.norm(np.diff(feet[..., :2], axis=0), axis=-1)
+    dt = times[1] - times[0]
+    slip = contact & (step / dt > slip_speed)
+    slip[1:] &= contact[:-1]  # 刚落地的那一帧不算打滑
+
+    feet_reports = []
+    for leg, name in enumerate(names):
+        contacts = [(times[a], times[b]) for a, b in _intervals(contact[:, leg])]
+        penetrations = [
+            (times[a], times[b], float(-clearance[a : b + 1, leg].min()))
+            for a, b in _intervals(penetration[:, leg])
+        ]
+        slips = [(times[a], times[b], float(step[a : b + 1, leg].sum())) for a, b in _intervals(slip[:, leg])]
+        feet_reports.append(FootReport(name, contacts, penetrations, slips, float(contact[:, leg].mean())))
+
+    return ContactReport(times, feet, contact, penetration, slip, feet_reports)
+
+
+def format_report(report):
+    lines = []
+    for foot in report.feet:
+        lines.append(
+            f"{foot.name}: duty {foot.duty_factor:.0%}, {len(foot.contacts)} stance, "
+            f"{len(foot.penetrations)} penetration, {len(foot.slips)} slip"
+        )
+        for t0, t1, depth in foot.penetrations:
+            lines.append(f"  penetration {t0:.2f}s - {t1:.2f}s (max {depth * 1000:.1f} mm)")
+        for t0, t1, distance in foot.slips:
+            lines.append(f"  slip {t0:.2f}s - {t1:.2f}s ({distance * 1000:.1f} mm)")
+    return "\n".join(lines)
+
+
+def show_contact_overlay(scene, report, name="/contact_overlay", point_size=0.01):
+    """把整段足端轨迹按接触状态着色，作为一个点云加入场景。"""
+    colors = np.empty(report.contact.shape + (3,), dtype=np.uint8)
+    colors[:] = OVERLAY_COLORS["swing"]
+    colors[report.contact] = OVERLAY_COLORS["stance"]
+    colors[report.slip] = OVERLAY_COLORS["slip"]
+    colors[report.penetration] = OVERLAY_COLORS["penetration"]
+    points = report.feet_pos.reshape(-1, 3).astype(np.float32)
+    return scene.add_point_cloud(name, points=points, colors=colors.reshape(-1, 3), point_size=point_size)
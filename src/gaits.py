@@ -0,0 +1,209 @@
+import hashlib
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+
+import hydra
+import numpy as np
+from omegaconf import DictConfig
+from rich import print
+
+from animator import Animator
+from contact import GROUND_HEIGHT, analyze_contacts
+from robot import FOOT_RADIUS
+
+LEGS = ["FL", "FR", "RL", "RR"]
+
+# 摆动相开头 / 结尾只抬脚 / 落脚、不前摆的比例；抬脚高度按 sin² 变化，此时已达到 step_height 的一半
+SWING_HOLD = 0.25
+
+# 各步态的相位偏移 (以周期为单位) 和默认占空比
+GAITS = {
+    "trot": {"offsets": {"FL": 0.0, "FR": 0.5, "RL": 0.5, "RR": 0.0}, "duty": 0.6},
+    "pace": {"offsets": {"FL": 0.0, "FR": 0.5, "RL": 0.0, "RR": 0.5}, "duty": 0.6},
+    "bound": {"offsets": {"FL": 0.0, "FR": 0.0, "RL": 0.5, "RR": 0.5}, "duty": 0.4},
+    "gallop": {"offsets": {"FL": 0.0, "FR": 0.1, "RL": 0.6, "RR": 0.5}, "duty": 0.35},
+    "crawl": {"offsets": {"FL": 0.0, "FR": 0.5, "RL": 0.75, "RR": 0.25}, "duty": 0.75},
+}
+
+
+class GaitParams(NamedTuple):
+    gait: str = "trot"
+    period: float = 0.5  # 一个步态周期 (s)
+    duty: float = None  # 支撑相占比，None 表示使用步态默认值
+    step_height: float = 0.08  # 摆动相足端抬高 (m)
+    speed: float = 0.4  # 基座前进速度 (m/s)
+    body_height: float = 0.3  # 基座平均高度 (m)
+    bob: float = 0.01  # 基座上下起伏幅值 (m)，每个周期起伏两次
+    offsets: dict = None  # {leg: phase}，None 表示使用步态默认值
+    cycles: int = 2
+    keyframes_per_cycle: int = 32
+    interpolation_method: str = "catmull_rom"  # 局部插值，全局三次样条在短摆动相附近会振荡
+
+
+def leg_ik(x, z, thigh_len, calf_len):
+    """
+    矢状面两连杆逆运动学 (与 contact.foot_positions 的正运动学一致，膝关节向后弯)。
+    x, z: 足端相对大腿关节的位置，可为任意形状的数组
+    Returns: (thigh, calf)
+    """
+    cos_calf = (x**2 + z**2 - thigh_len**2 - calf_len**2) / (2.0 * thigh_len * calf_len)
+    calf = -np.arccos(np.clip(cos_calf, -1.0, 1.0))
+    thigh = np.arctan2(-x, -z) - np.arctan2(calf_len * np.sin(calf), thigh_len + calf_len * np.cos(calf))
+    return thigh, calf
+
+
+def generate_gait(params, thigh_len, calf_len):
+    """
+    生成一个步态片段，返回 Animator JSON 格式的字典。
+    所有关键帧和四条腿在一次数组运算中求解: 支撑相足端以基座速度相对机身后移 (世界系中静止)，
+    摆动相抬脚高度取 sin²，落地时竖直速度为零，插值后不易穿地。
+    """
+    gait = GAITS[params.gait]
+    duty = gait["duty"] if params.duty is None else params.duty
+    offsets = gait["offsets"] if params.offsets is None else params.offsets
+
+    n = params.cycles * params.keyframes_per_cycle
+    duration = params.cycles * params.period
+    times = np.linspace(0.0, duration, n + 1)  # (T,)
+
+    base_z = params.body_height + params.bob * np.cos(4.0 * np.pi * times / params.period)
+    base_x = params.speed * times
+    stride = params.speed * duty * params.period
+
+    phase = (times[:, None] / params.period + np.array([offsets[leg] for leg in LEGS])) % 1.0  # (T, L)
+    stance = phase < duty
+    u_stance = phase / duty
+    u_swing = (phase - duty) / (1.0 - duty)
+
+    # 摆动相足端在世界系中按五次 smoothstep 前移一个步长 (speed * period)，只在摆动中段
+    # [SWING_HOLD, 1 - SWING_HOLD] 内移动；相对机身的速度在离地 / 落地附近恒为 -speed，与支撑相衔接，
+    # 足端先抬离地面再前摆、先落地再停止前摆，因此不会在地面上拖动
+    w = np.clip((u_swing - SWING_HOLD) / (1.0 - 2.0 * SWING_HOLD), 0.0, 1.0)
+    smooth = w**3 * (10.0 - 15.0 * w + 6.0 * w**2)
+    swing_time = (1.0 - duty) * params.period
+    swing_x = -0.5 * stride + params.speed * params.period * smooth - params.speed * swing_time * u_swing
+    x = np.where(stance, stride * (0.5 - u_stance), swing_x)
+    ground = GROUND_HEIGHT + FOOT_RADIUS - base_z[:, None]  # 足端贴地时相对机身的高度
+    z = ground + np.where(stance, 0.0, params.step_height * np.sin(np.pi * u_swing) ** 2)
+    thigh, calf = leg_ik(x, z, thigh_len, calf_len)
+
+    keyframes = []
+    for i, t in enumerate(times):
+        pose = {}
+        for leg_index, leg in enumerate(LEGS):
+            pose[f"{leg}_hip"] = 0.0
+            pose[f"{leg}_thigh"] = float(thigh[i, leg_index])
+            pose[f"{leg}_calf"] = float(calf[i, leg_index])
+        keyframes.append(
+            {
+                "time": float(t),
+                "pose": pose,
+                "base": {"pos": [float(base_x[i]), 0.0, float(base_z[i])], "rpy": [0.0, 0.0, 0.0]},
+            }
+        )
+
+    return {
+        "duration": float(duration),
+        "interpolation_method": params.interpolation_method,
+        "keyframes": keyframes,
+        "gait": {**params._asdict(), "duty": duty, "offsets": dict(offsets)},
+    }
+
+
+def check_no_slip(clip, robot_cfg):
+    """
+    用 contact.analyze_contacts 检查生成的片段: 不允许穿地，也不允许支撑相内足端滑移，否则抛出 ValueError。
+    支撑判定阈值取步高的 10% (最多 1 cm)：固定 1 cm 时低抬腿片段中刚离地、已开始前摆的摆动足仍在阈值内，
+    会被误判为支撑相滑移。
+    """
+    animator = Animator()
+    animator.load_from_dict(clip)
+    tolerance = min(0.01, 0.1 * clip["gait"]["step_height"])
+    report = analyze_contacts(animator, robot_cfg, contact_tolerance=tolerance)
+    problems = []
+    for foot in report.feet:
+        if foot.slips:
+            problems.append(f"{foot.name} slips at {foot.slips}")
+        if foot.penetrations:
+            problems.append(f"{foot.name} penetrates at {foot.penetrations}")
+    if problems:
+        raise ValueError(f"{clip['gait']['gait']}: " + "; ".join(problems))
+
+
+def clip_name(params):
+    """可读的主要参数加上全部参数的短哈希，保证扫描中参数不同的片段不会重名。"""
+    duty = GAITS[params.gait]["duty"] if params.duty is None else params.duty
+    digest = hashlib.sha1(json.dumps(params._asdict(), sort_keys=True).encode("utf-8")).hexdigest()[:8]
+    return (
+        f"{params.gait}_T{params.period:g}_d{duty:g}_h{params.step_height:g}"
+        f"_v{params.speed:g}_z{params.body_height:g}_{digest}.json"
+    )
+
+
+def sweep(**grid):
+    """
+    按参数网格做笛卡尔积，例如 sweep(gait=["trot", "pace"], period=[0.4, 0.5])。
+    未给出的参数使用 GaitParams 的默认值。
+    """
+    keys = list(grid)
+    return [GaitParams(**dict(zip(keys, values))) for values in itertools.product(*(grid[k] for k in keys))]
+
+
+def _generate_to_file(args):
+    """Returns: (path, None)，检查未通过时不写文件并返回 (None, 错误信息)"""
+    params, robot_cfg, out_dir, verify = args
+    clip = generate_gait(params, robot_cfg.thigh_len, robot_cfg.calf_len)
+    name = clip_name(params)
+    if verify:
+        try:
+            check_no_slip(clip, robot_cfg)
+        except ValueError as e:
+            return None, f"{name}: {e}"
+    path = os.path.join(out_dir, name)
+    with open(path, "w") as f:
+        json.dump(clip, f, indent=2)
+    return path, None
+
+
+def generate_batch(params_list, robot_cfg, out_dir, workers=None, verify=True):
+    """
+    在进程池中并行生成并写出一批片段。
+    verify: 写出前用接触分析检查每个片段 (见 check_no_slip)，未通过的片段不写出，也不影响其他片段
+    Returns: (paths, failures)，paths 为写出的文件 (按 params_list 顺序)，failures 为未通过检查的说明
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    jobs = [(params, robot_cfg, out_dir, verify) for params in params_list]
+    if workers == 1:
+        results = [_generate_to_file(job) for job in jobs]
+    else:
+        # 单个片段的生成很快，分块提交以减少进程间往返
+        chunksize = max(1, len(jobs) // (4 * (workers or os.cpu_count() or 1)))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_generate_to_file, jobs, chunksize=chunksize))
+    paths = [path for path, _ in results if path is not None]
+    failures = [error for _, error in results if error is not None]
+    return paths, failures
+
+
+@hydra.main(version_base=None, config_path="../config", config_name="config")
+def main(cfg: DictConfig):
+    gaits_cfg = cfg.gaits
+    grid = {key: list(values) for key, values in gaits_cfg.sweep.items()}
+    params_list = sweep(**grid)
+
+    start = time.perf_counter()
+    paths, failures = generate_batch(
+        params_list, cfg.robot, gaits_cfg.out_dir, workers=gaits_cfg.workers, verify=gaits_cfg.verify
+    )
+    elapsed = time.perf_counter() - start
+    print(f"[green]Generated {len(paths)} clips[/green] in {gaits_cfg.out_dir} ({elapsed:.2f} s)")
+    for error in failures:
+        print(f"[red]Rejected {error}[/red]")
+
+
+if __name__ == "__main__":
+    main()
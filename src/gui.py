@@ -1,9 +1,28 @@
+import fnmatch
+import time
 import viser
 import numpy as np
 from rich import print
 
+from animator import Animator, INTERPOLATION_METHODS
+from blender import ClipBlender, ClipLayer, crossfade
+from coalesce import CoalescingWorker
+from contact import analyze_contacts, format_report, show_contact_overlay
+from gaits import GAITS, GaitParams, generate_gait
+from robot import leg_mounts
+from transforms import SIDES, mirror, offset_scale, phase_shift, reverse
+
 
 class GUI:
+    # 拖动时间轴时求值 / 渲染的最高频率 (Hz)
+    SCRUB_RATE = 60.0
+    # 关键帧浏览器每页的条目数
+    KEYFRAME_PAGE_SIZE = 50
+    # 时间轴关键帧分布条的分箱数
+    MARKER_BINS = 120
+    # 动画库搜索结果每页的条目数
+    LIBRARY_PAGE_SIZE = 100
+
     def __init__(self, app):
         self.app = app
         self.server = app.server
@@ -18,6 +37,14 @@ class GUI:
         self.time_slider = None
         self.keyframe_selector = None
         self.keyframe_info = None
+        self.keyframe_markers = None
+
+        # 关键帧浏览器: 当前页、当前页的 标签 -> id 映射，以及上次发送给客户端的内容 (只在变化时重发)
+        self.keyframe_page = 0
+        self._keyframe_labels = {}
+        self._sent_keyframe_options = None
+        self._sent_marker_key = None
+        self.library_page = 0
         self.duration_number = None
         self.interp_dropdown = None
 
@@ -26,9 +53,16 @@ class GUI:
         self.ghost_mode_dropdown = None
         self.ghost_offset_slider = None
 
+        # 片段变换或混合的预览 (Animator 或 ClipBlender)，非 None 时由 Ghost 机器人显示
+        self.preview_animator = None
+
         # System Elements
         self.file_name_input = None
 
+        # 拖动时间轴和 Ghost 更新只保留最新的请求，在后台按限定频率求值
+        self._scrub_worker = CoalescingWorker(self._scrub, 1.0 / self.SCRUB_RATE, name="scrub")
+        self._ghost_worker = CoalescingWorker(self._update_ghost, 1.0 / self.SCRUB_RATE, name="ghost")
+
     def setup(self):
         tabs = self.server.gui.add_tab_group()
 
@@ -51,61 +85,51 @@ class GUI:
             speed_slider = self.server.gui.add_slider("Speed", min=0.1, max=3.0, step=0.1, initial_value=1.0)
 
             self.time_slider = self.server.gui.add_slider(
-                "Time", min=0.0, max=self.app.gui_state["duration"], step=0.01, initial_value=0.0
+                "Time", min=0.0, max=self.app.state.snapshot().duration, step=0.01, initial_value=0.0
             )
 
             self.duration_number = self.server.gui.add_number("Duration (s)", initial_value=2.0, min=0.1, max=10.0)
 
             self.interp_dropdown = self.server.gui.add_dropdown(
-                "Interpolation", options=["linear", "cubic", "zero", "slinear", "quadratic"], initial_value="linear"
+                "Interpolation", options=INTERPOLATION_METHODS, initial_value="linear"
             )
 
             # Callbacks
             @self.play_button.on_click
             def _(_):
-                self.app.gui_state["playing"] = True
+                self.app.state.update(playing=True, tick_time=time.time())
                 self.update_play_pause_buttons()
 
             @self.pause_button.on_click
             def _(_):
-                self.app.gui_state["playing"] = False
+                self.app.state.update(playing=False, time=self.app.get_playback_time())
                 self.update_play_pause_buttons()
 
             @stop_button.on_click
             def _(_):
-                self.app.gui_state["playing"] = False
-                self.app.gui_state["time"] = 0.0
+                self.app.state.update(playing=False, time=0.0)
                 self.time_slider.value = 0.0
                 self.update_play_pause_buttons()
 
             @loop_checkbox.on_update
             def _(event):
-                self.app.gui_state["loop"] = event.target.value
+                self.app.state.update(loop=event.target.value)
 
             @speed_slider.on_update
             def _(event):
-                self.app.gui_state["speed"] = event.target.value
+                # 以当前时刻为新的外推起点，避免改变速度时时间跳变
+                self.app.state.update(
+                    speed=event.target.value, time=self.app.get_playback_time(), tick_time=time.time()
+                )
 
             @self.time_slider.on_update
             def _(event):
-                if not self.app.gui_state["playing"]:
-                    t = event.target.value
-                    self.app.gui_state["time"] = t
-                    if self.app.animator.keyframes:
-                        pose, b_pos, b_rpy = self.app.animator.get_state_at_time(t)
-                        self.app.robot.update_pose(pose)
-                        self.app.robot.update_base(b_pos, b_rpy)
-                        self.sync_sliders(pose, b_pos, b_rpy)
-                        self.update_ghost_pose(t)
-
-                        # Sync app state
-                        self.app.current_pose.update(pose)
-                        self.app.current_base_pos[:] = b_pos
-                        self.app.current_base_rpy[:] = b_rpy
+                if not self.app.state.snapshot().playing:
+                    self.scrub_to(event.target.value)
 
             @self.duration_number.on_update
             def _(event):
-                self.app.gui_state["duration"] = event.target.value
+                self.app.state.update(duration=event.target.value)
                 self.app.animator.duration = event.target.value
                 self.time_slider.max = event.target.value
 
@@ -121,83 +145,216 @@ class GUI:
             )
             clear_keyframes_btn = self.server.gui.add_button("Clear All", icon=viser.Icon.TRASH)
 
+            # 关键帧按页列出，选项只包含当前页，选中项按稳定 id 定位
             self.keyframe_selector = self.server.gui.add_dropdown(
                 "Select Keyframe", options=["None"], initial_value="None"
             )
+            page_buttons = self.server.gui.add_button_group("Page", options=["Prev", "Next", "Current Time"])
             self.keyframe_info = self.server.gui.add_text("Keyframes: 0", initial_value="Count: 0")
+            # 所有关键帧在时间轴上的分布，整体作为一个 SVG 元素更新
+            self.keyframe_markers = self.server.gui.add_html("")
 
             @add_keyframe_btn.on_click
             def _(_):
-                t = self.app.gui_state["time"]
-                self.app.animator.add_keyframe(
-                    t, self.app.current_pose, self.app.current_base_pos, self.app.current_base_rpy
+                snap = self.app.state.snapshot()
+                t = snap.time
+                keyframe_id = self.app.animator.add_keyframe(
+                    self.app.animator.warp_time(t), dict(snap.pose), snap.base_pos, snap.base_rpy
                 )
-                self.keyframe_info.value = f"Count: {len(self.app.animator.keyframes)}"
-                self.update_keyframe_dropdown()
-                self.keyframe_selector.value = f"{t:.2f}s"
+                self.update_keyframe_dropdown(select_id=keyframe_id)
                 print(f"[green]Added keyframe at {t:.2f}s[/green]")
 
             @update_keyframe_btn.on_click
             def _(_):
-                if self.keyframe_selector.value == "None":
+                keyframe_id = self.selected_keyframe_id()
+                if keyframe_id is None:
                     print("[yellow]No keyframe selected to update[/yellow]")
                     return
-                try:
-                    t = float(self.keyframe_selector.value.replace("s", ""))
-                    self.app.animator.add_keyframe(
-                        t, self.app.current_pose, self.app.current_base_pos, self.app.current_base_rpy
-                    )
-                    print(f"[green]Updated keyframe at {t:.2f}s[/green]")
-                except ValueError:
-                    print("[red]Invalid keyframe selection[/red]")
+                snap = self.app.state.snapshot()
+                if self.app.animator.update_keyframe(keyframe_id, dict(snap.pose), snap.base_pos, snap.base_rpy):
+                    print(f"[green]Updated keyframe #{keyframe_id}[/green]")
 
             @delete_keyframe_btn.on_click
             def _(_):
-                if self.keyframe_selector.value == "None":
+                keyframe_id = self.selected_keyframe_id()
+                if keyframe_id is None:
                     return
-                try:
-                    t = float(self.keyframe_selector.value.replace("s", ""))
-                    idx_to_remove = -1
-                    for i, k in enumerate(self.app.animator.keyframes):
-                        if np.isclose(k["time"], t):
-                            idx_to_remove = i
-                            break
-                    if idx_to_remove != -1:
-                        self.app.animator.remove_keyframe(idx_to_remove)
-                        self.keyframe_info.value = f"Count: {len(self.app.animator.keyframes)}"
-                        self.update_keyframe_dropdown()
-                        print(f"[red]Deleted keyframe at {t:.2f}s[/red]")
-                except ValueError:
-                    pass
+                idx = self.app.animator.find_keyframe(keyframe_id, hint=self._keyframe_index_hint(keyframe_id))
+                if idx is not None:
+                    self.app.animator.remove_keyframe(idx)
+                    self.update_keyframe_dropdown()
+                    print(f"[red]Deleted keyframe #{keyframe_id}[/red]")
 
             @clear_keyframes_btn.on_click
             def _(_):
                 self.app.animator.clear_keyframes()
-                self.keyframe_info.value = "Count: 0"
                 self.update_keyframe_dropdown()
                 print("[red]Cleared all keyframes[/red]")
 
+            @page_buttons.on_click
+            def _(event):
+                if event.target.value == "Prev":
+                    self.keyframe_page -= 1
+                    self.update_keyframe_dropdown()
+                elif event.target.value == "Next":
+                    self.keyframe_page += 1
+                    self.update_keyframe_dropdown()
+                elif self.app.animator.keyframes:
+                    # 跳到当前时间之前最近的关键帧所在的页
+                    times = self.app.animator.unwarp_time(np.array([k["time"] for k in self.app.animator.keyframes]))
+                    idx = max(int(np.searchsorted(times, self.app.state.snapshot().time, side="right")) - 1, 0)
+                    self.update_keyframe_dropdown(select_id=self.app.animator.keyframe_ids()[idx])
+
             @self.keyframe_selector.on_update
             def _(event):
-                if event.target.value == "None":
+                # 翻页 / 删除时程序化改写选项和选中项 (client 为 None) 也会异步触发回调，不跳转时间
+                if event.client is None:
+                    return
+                keyframe_id = self._keyframe_labels.get(event.target.value)
+                if keyframe_id is None:
                     return
+                idx = self.app.animator.find_keyframe(keyframe_id, hint=self._keyframe_index_hint(keyframe_id))
+                if idx is None:
+                    return
+                # 关键帧时间是源时间，时间轴显示的是播放时间
+                t = float(self.app.animator.unwarp_time(self.app.animator.keyframes[idx]["time"]))
+                self._update_keyframe_markers()
+                if not self.app.state.snapshot().playing:
+                    self.time_slider.value = t
+                    self.scrub_to(t)
+
+        with self.server.gui.add_folder("Retime"):
+            target_duration_number = self.server.gui.add_number(
+                "Target Duration (s)", initial_value=2.0, min=0.1, max=10.0
+            )
+            scale_btn = self.server.gui.add_button("Scale To Duration", icon=viser.Icon.ARROWS_MAXIMIZE)
+            ease_start_number = self.server.gui.add_number("Ease Start (s)", initial_value=0.0, min=0.0, step=0.01)
+            ease_end_number = self.server.gui.add_number("Ease End (s)", initial_value=1.0, min=0.0, step=0.01)
+            ease_mode_dropdown = self.server.gui.add_dropdown(
+                "Ease Mode", options=["in_out", "in", "out"], initial_value="in_out"
+            )
+            ease_btn = self.server.gui.add_button("Apply Ease", icon=viser.Icon.CHART_LINE)
+            # 自定义时间扭曲: 两组逗号分隔的节点，源时间 -> 播放时间
+            warp_source_input = self.server.gui.add_text("Warp Source (s)", initial_value="0, 1, 2")
+            warp_playback_input = self.server.gui.add_text("Warp Playback (s)", initial_value="0, 1.5, 2")
+            warp_kind_dropdown = self.server.gui.add_dropdown(
+                "Warp Curve", options=["linear", "spline"], initial_value="linear"
+            )
+            set_warp_btn = self.server.gui.add_button("Set Time Warp", icon=viser.Icon.CHART_LINE)
+            bake_warp_btn = self.server.gui.add_button("Bake Time Warp", icon=viser.Icon.DEVICE_FLOPPY)
+            clear_warp_btn = self.server.gui.add_button("Clear Time Warp", icon=viser.Icon.TRASH)
+
+            @scale_btn.on_click
+            def _(_):
                 try:
-                    t = float(event.target.value.replace("s", ""))
-                    if not self.app.gui_state["playing"]:
-                        self.app.gui_state["time"] = t
-                        self.time_slider.value = t
-
-                        pose, b_pos, b_rpy = self.app.animator.get_state_at_time(t)
-                        self.app.robot.update_pose(pose)
-                        self.app.robot.update_base(b_pos, b_rpy)
-                        self.sync_sliders(pose, b_pos, b_rpy)
-                        self.update_ghost_pose(t)
-
-                        self.app.current_pose.update(pose)
-                        self.app.current_base_pos[:] = b_pos
-                        self.app.current_base_rpy[:] = b_rpy
-                except ValueError:
-                    pass
+                    self.app.animator.scale_to_duration(target_duration_number.value)
+                except ValueError as e:
+                    print(f"[red]{e}[/red]")
+                    return
+                self.duration_number.value = self.app.animator.duration
+                self.update_keyframe_dropdown()
+                print(f"[green]Scaled animation to {self.app.animator.duration:.2f}s[/green]")
+
+            @ease_btn.on_click
+            def _(_):
+                try:
+                    self.app.animator.ease_segment(
+                        ease_start_number.value, ease_end_number.value, mode=ease_mode_dropdown.value
+                    )
+                except ValueError as e:
+                    print(f"[red]{e}[/red]")
+                    return
+                self.update_keyframe_dropdown()
+                print(
+                    f"[green]Eased {ease_start_number.value:.2f}s - {ease_end_number.value:.2f}s "
+                    f"({ease_mode_dropdown.value})[/green]"
+                )
+
+            @set_warp_btn.on_click
+            def _(_):
+                try:
+                    source = [float(v) for v in warp_source_input.value.split(",") if v.strip()]
+                    playback = [float(v) for v in warp_playback_input.value.split(",") if v.strip()]
+                    self.app.animator.set_time_warp(source, playback, kind=warp_kind_dropdown.value)
+                except ValueError as e:
+                    print(f"[red]{e}[/red]")
+                    return
+                self.duration_number.value = self.app.animator.duration
+                self.update_keyframe_dropdown()
+                print(f"[green]Set {warp_kind_dropdown.value} time warp ({self.app.animator.duration:.2f}s)[/green]")
+
+            @bake_warp_btn.on_click
+            def _(_):
+                self.app.animator.bake_time_warp()
+                self.update_keyframe_dropdown()
+                print("[green]Baked time warp into keyframes[/green]")
+
+            @clear_warp_btn.on_click
+            def _(_):
+                self.app.animator.clear_time_warp()
+                self.duration_number.value = self.app.animator.duration
+                self.update_keyframe_dropdown()
+                print("[red]Cleared time warp[/red]")
+
+        with self.server.gui.add_folder("Clip Transforms"):
+            transform_dropdown = self.server.gui.add_dropdown(
+                "Operation", options=["Mirror L <-> R", "Phase Shift", "Reverse", "Offset / Scale"]
+            )
+            shift_side_dropdown = self.server.gui.add_dropdown("Shift Legs", options=list(SIDES), initial_value="right")
+            shift_cycles_number = self.server.gui.add_number("Shift (cycles)", initial_value=0.5, step=0.05)
+            shift_period_number = self.server.gui.add_number(
+                "Cycle Period (s, 0 = clip)", initial_value=0.0, min=0.0, step=0.05
+            )
+            transform_joints_input = self.server.gui.add_text("Joints (glob)", initial_value="*_thigh, *_calf")
+            transform_offset_number = self.server.gui.add_number("Offset (rad)", initial_value=0.0, step=0.01)
+            transform_scale_number = self.server.gui.add_number("Scale", initial_value=1.0, step=0.05)
+            preview_transform_btn = self.server.gui.add_button("Preview On Ghost", icon=viser.Icon.EYE)
+            apply_transform_btn = self.server.gui.add_button("Apply To Clip", icon=viser.Icon.CHECK)
+            discard_transform_btn = self.server.gui.add_button("Discard Preview", icon=viser.Icon.X)
+
+            def build_transform():
+                animator = self.app.animator
+                op = transform_dropdown.value
+                if op == "Mirror L <-> R":
+                    robot = self.app.robot
+                    axes = dict(zip(robot.pose_names, robot.joint_axes))
+                    return mirror(animator, joint_axes=axes)
+                if op == "Phase Shift":
+                    period = shift_period_number.value or None
+                    return phase_shift(animator, SIDES[shift_side_dropdown.value], shift_cycles_number.value, period)
+                if op == "Reverse":
+                    return reverse(animator)
+                patterns = [p.strip() for p in transform_joints_input.value.split(",") if p.strip()]
+                names = [n for n in animator.joint_names if any(fnmatch.fnmatch(n, p) for p in patterns)]
+                return offset_scale(animator, names, transform_offset_number.value, transform_scale_number.value)
+
+            @preview_transform_btn.on_click
+            def _(_):
+                if not self.app.animator.keyframes:
+                    print("[yellow]No keyframes to transform[/yellow]")
+                    return
+                self.preview_animator = build_transform()
+                self.app.ghost_robot.set_visible(True)
+                self.update_ghost_pose(self.app.state.snapshot().time)
+                print(f"[green]Previewing {transform_dropdown.value} on ghost[/green]")
+
+            @apply_transform_btn.on_click
+            def _(_):
+                if not self.app.animator.keyframes:
+                    return
+                # 总是基于当前片段和当前参数重新计算，预览之后的编辑不会被旧的预览结果覆盖
+                self.app.animator = build_transform()
+                self.preview_animator = None
+                self.app.ghost_robot.set_visible(self.show_ghost_checkbox.value)
+                self.refresh_animation_widgets()
+                self.scrub_to(self.app.state.snapshot().time)
+                print(f"[green]Applied {transform_dropdown.value} to clip[/green]")
+
+            @discard_transform_btn.on_click
+            def _(_):
+                self.preview_animator = None
+                self.app.ghost_robot.set_visible(self.show_ghost_checkbox.value)
+                self.update_ghost_pose(self.app.state.snapshot().time)
 
         with self.server.gui.add_folder("Ghost / Residual"):
             self.show_ghost_checkbox = self.server.gui.add_checkbox("Show Ghost", initial_value=False)
@@ -211,19 +368,16 @@ class GUI:
 
             @self.show_ghost_checkbox.on_update
             def _(event):
-                visible = event.target.value
-                self.app.ghost_robot.base.visible = visible
-                for joint in self.app.ghost_robot.joints.values():
-                    joint.visible = visible
-                self.update_ghost_pose(self.app.gui_state["time"])
+                self.app.ghost_robot.set_visible(event.target.value)
+                self.update_ghost_pose(self.app.state.snapshot().time)
 
             @self.ghost_mode_dropdown.on_update
             def _(event):
-                self.update_ghost_pose(self.app.gui_state["time"])
+                self.update_ghost_pose(self.app.state.snapshot().time)
 
             @self.ghost_offset_slider.on_update
             def _(event):
-                self.update_ghost_pose(self.app.gui_state["time"])
+                self.update_ghost_pose(self.app.state.snapshot().time)
 
     def _setup_pose_tab(self):
         with self.server.gui.add_folder("Edit Tools"):
@@ -237,7 +391,7 @@ class GUI:
             @copy_pose_btn.on_click
             def _(_):
                 clipboard_pose.clear()
-                clipboard_pose.update(self.app.current_pose)
+                clipboard_pose.update(self.app.state.snapshot().pose)
                 print("[green]Pose copied to clipboard[/green]")
 
             @paste_pose_btn.on_click
@@ -245,9 +399,8 @@ class GUI:
                 if not clipboard_pose:
                     print("[yellow]Clipboard is empty[/yellow]")
                     return
-                self.app.current_pose.update(clipboard_pose)
-                self.app.robot.update_pose(self.app.current_pose)
-                self.sync_sliders(pose=self.app.current_pose)
+                snap = self.app.state.update_pose(clipboard_pose)
+                self.sync_sliders(pose=snap.pose)
                 print("[green]Pose pasted[/green]")
 
             @mirror_lr_btn.on_click
@@ -266,30 +419,32 @@ class GUI:
 
             @reset_all_btn.on_click
             def _(_):
-                default_pose = self.app.robot.get_default_pose()
-                self.app.current_pose.update(default_pose)
-                self.app.robot.update_pose(self.app.current_pose)
-                self.sync_sliders(pose=self.app.current_pose)
+                snap = self.app.state.update_pose(self.app.robot.get_default_pose())
+                self.sync_sliders(pose=snap.pose)
 
             @reset_base_btn.on_click
             def _(_):
-                self.app.current_base_pos[:] = [0.0, 0.0, 0.4]
-                self.app.current_base_rpy[:] = [0.0, 0.0, 0.0]
-                self.app.robot.update_base(self.app.current_base_pos, self.app.current_base_rpy)
-                self.sync_sliders(b_pos=self.app.current_base_pos, b_rpy=self.app.current_base_rpy)
+                snap = self.app.state.update(base_pos=(0.0, 0.0, 0.4), base_rpy=(0.0, 0.0, 0.0))
+                self.sync_sliders(b_pos=snap.base_pos, b_rpy=snap.base_rpy)
 
             # Base Sliders
             for i, axis in enumerate(["x", "y", "z"]):
                 slider = self.server.gui.add_slider(
-                    f"Pos {axis.upper()}", min=-2.0, max=2.0, step=0.01, initial_value=self.app.current_base_pos[i]
+                    f"Pos {axis.upper()}",
+                    min=-2.0,
+                    max=2.0,
+                    step=0.01,
+                    initial_value=self.app.state.snapshot().base_pos[i],
                 )
                 self.base_sliders[f"pos_{axis}"] = slider
 
                 def make_pos_callback(idx):
                     def callback(event):
-                        if not self.app.gui_state["playing"]:
-                            self.app.current_base_pos[idx] = event.target.value
-                            self.app.robot.update_base(self.app.current_base_pos, self.app.current_base_rpy)
+                        # sync_sliders 的回写 (client 为 None) 不是用户操作，见 make_slider_callback
+                        if event.client is None:
+                            return
+                        if not self.app.state.snapshot().playing:
+                            self.app.state.set_base_component("base_pos", idx, event.target.value)
 
                     return callback
 
@@ -297,56 +452,60 @@ class GUI:
 
             for i, axis in enumerate(["roll", "pitch", "yaw"]):
                 slider = self.server.gui.add_slider(
-                    f"Rot {axis.upper()}", min=-3.14, max=3.14, step=0.01, initial_value=self.app.current_base_rpy[i]
+                    f"Rot {axis.upper()}",
+                    min=-3.14,
+                    max=3.14,
+                    step=0.01,
+                    initial_value=self.app.state.snapshot().base_rpy[i],
                 )
                 self.base_sliders[f"rot_{axis}"] = slider
 
                 def make_rot_callback(idx):
                     def callback(event):
-                        if not self.app.gui_state["playing"]:
-                            self.app.current_base_rpy[idx] = event.target.value
-                            self.app.robot.update_base(self.app.current_base_pos, self.app.current_base_rpy)
+                        # sync_sliders 的回写 (client 为 None) 不是用户操作，见 make_slider_callback
+                        if event.client is None:
+                            return
+                        if not self.app.state.snapshot().playing:
+                            self.app.state.set_base_component("base_rpy", idx, event.target.value)
 
                     return callback
 
                 slider.on_update(make_rot_callback(i))
 
-        # Joint Sliders
-        legs = ["FL", "FR", "RL", "RR"]
-        joints = ["hip", "thigh", "calf"]
+        # Joint Sliders (按关节名前缀分组，如 FL / FR / RL / RR)
+        leg_names = {m["name"] for m in leg_mounts(self.app.robot.body_dims)}
 
-        for leg in legs:
-            with self.server.gui.add_folder(f"{leg} Leg"):
-                reset_leg_btn = self.server.gui.add_button(f"Reset {leg}", icon=viser.Icon.ROTATE_2)
+        for group, joint_names in self.app.robot.joint_groups().items():
+            folder_label = f"{group} Leg" if group in leg_names else group
+            with self.server.gui.add_folder(folder_label):
+                reset_leg_btn = self.server.gui.add_button(f"Reset {group}", icon=viser.Icon.ROTATE_2)
 
                 @reset_leg_btn.on_click
-                def _(event, leg_name=leg):
+                def _(event, names=joint_names):
                     default_pose = self.app.robot.get_default_pose()
-                    for j in joints:
-                        full_name = f"{leg_name}_{j}"
-                        val = default_pose[full_name]
-                        self.app.current_pose[full_name] = val
-                        if full_name in self.joint_sliders:
-                            self.joint_sliders[full_name].value = val
-                    self.app.robot.update_pose(self.app.current_pose)
-
-                for joint in joints:
-                    joint_name = f"{leg}_{joint}"
-                    limits = self.app.robot.limits[joint]
+                    group_pose = {name: default_pose[name] for name in names}
+                    self.app.state.update_pose(group_pose)
+                    self.sync_sliders(pose=group_pose)
+
+                for joint_name in joint_names:
+                    limits = self.app.robot.joint_limits[joint_name]
                     slider = self.server.gui.add_slider(
-                        label=joint,
+                        label=joint_name[len(group) + 1 :] if joint_name.startswith(f"{group}_") else joint_name,
                         min=limits[0],
                         max=limits[1],
                         step=0.01,
-                        initial_value=self.app.current_pose.get(joint_name, 0.0),
+                        initial_value=self.app.state.snapshot().pose.get(joint_name, 0.0),
                     )
                     self.joint_sliders[joint_name] = slider
 
                     def make_slider_callback(name):
                         def callback(event):
-                            if not self.app.gui_state["playing"]:
-                                self.app.current_pose[name] = event.target.value
-                                self.app.robot.update_pose(self.app.current_pose)
+                            # sync_sliders 程序化回写时 client 为 None；viser 在线程池里异步执行回调，
+                            # 回写的旧值可能晚于下一帧的状态到达，必须忽略而不能与当前状态比较
+                            if event.client is None:
+                                return
+                            if not self.app.state.snapshot().playing:
+                                self.app.state.set_joint(name, event.target.value)
 
                         return callback
 
@@ -372,64 +531,413 @@ class GUI:
                 filename = self.file_name_input.value
                 try:
                     self.app.animator.load_from_file(filename)
-                    self.keyframe_info.value = f"Count: {len(self.app.animator.keyframes)}"
-                    self.duration_number.value = self.app.animator.duration
-                    self.interp_dropdown.value = self.app.animator.interpolation_method
-                    self.update_keyframe_dropdown()
+                    self.refresh_animation_widgets()
                     print(f"[green]Loaded animation from {filename}[/green]")
                 except Exception as e:
                     print(f"[red]Error loading: {e}[/red]")
 
+        with self.server.gui.add_folder("Contact Analysis"):
+            analyze_btn = self.server.gui.add_button("Analyze Contacts", icon=viser.Icon.SHOE)
+            overlay_checkbox = self.server.gui.add_checkbox("Show Contact Overlay", initial_value=True)
+            contact_summary = self.server.gui.add_markdown("No analysis yet.")
+            overlay = {}
+
+            @analyze_btn.on_click
+            def _(_):
+                if len(self.app.animator.keyframes) < 2:
+                    print("[yellow]Need at least 2 keyframes to analyze contacts[/yellow]")
+                    return
+                report = analyze_contacts(self.app.animator, self.app.cfg.robot)
+                text = format_report(report)
+                contact_summary.content = "\n".join(f"- {line.strip()}" for line in text.splitlines())
+                print(text)
+
+                overlay["handle"] = show_contact_overlay(self.app.scene, report)
+                self.app.scene.set_visible(overlay["handle"], overlay_checkbox.value)
+
+            @overlay_checkbox.on_update
+            def _(event):
+                if "handle" in overlay:
+                    self.app.scene.set_visible(overlay["handle"], event.target.value)
+
+        with self.server.gui.add_folder("Streaming"):
+            stream_checkbox = self.server.gui.add_checkbox(
+                "Stream Joint Targets", initial_value=self.app.cfg.stream.enabled
+            )
+            streamer = self.app.streamer
+            self.server.gui.add_markdown(
+                f"{streamer.transport.upper()} → `{streamer.address}` @ {streamer.rate:.0f} Hz"
+            )
+
+            @stream_checkbox.on_update
+            def _(event):
+                if event.target.value:
+                    self.app.streamer.start()
+                else:
+                    self.app.streamer.stop()
+
+        with self.server.gui.add_folder("Library"):
+            library_search = self.server.gui.add_text("Search", initial_value="")
+            library_joint = self.server.gui.add_text("Has Joint", initial_value="")
+            library_min_duration = self.server.gui.add_number("Min Duration (s)", initial_value=0.0, min=0.0)
+            library_max_duration = self.server.gui.add_number("Max Duration (s)", initial_value=0.0, min=0.0)
+            refresh_library_btn = self.server.gui.add_button("Refresh Index", icon=viser.Icon.REFRESH)
+            library_results = self.server.gui.add_dropdown("Clips", options=["None"], initial_value="None")
+            library_page_buttons = self.server.gui.add_button_group("Results Page", options=["Prev", "Next"])
+            library_count = self.server.gui.add_markdown("")
+            library_info = self.server.gui.add_markdown(f"{self.app.library.count()} clips indexed")
+            load_clip_btn = self.server.gui.add_button("Load Selected Clip", icon=viser.Icon.FOLDER_OPEN)
+
+            def update_results(*_):
+                filters = {
+                    "text": library_search.value,
+                    "joint": library_joint.value or None,
+                    "min_duration": library_min_duration.value or None,
+                    "max_duration": library_max_duration.value or None,
+                }
+                # 下拉框只放一页结果，超出部分翻页查看，并显示总匹配数以免误以为结果不全
+                size = self.LIBRARY_PAGE_SIZE
+                total = self.app.library.search_count(**filters)
+                pages = max(1, -(-total // size))
+                self.library_page = min(max(self.library_page, 0), pages - 1)
+                start = self.library_page * size
+                results = self.app.library.search(**filters, limit=size, offset=start)
+                library_results.options = [r["path"] for r in results] or ["None"]
+                if total > size:
+                    library_count.content = (
+                        f"{start + 1}–{start + len(results)} of {total} matches (page {self.library_page + 1}/{pages})"
+                    )
+                else:
+                    library_count.content = f"{total} matches"
+
+            def new_search(*_):
+                self.library_page = 0
+                update_results()
+
+            @library_page_buttons.on_click
+            def _(event):
+                self.library_page += 1 if event.target.value == "Next" else -1
+                update_results()
+
+            @library_results.on_update
+            def _(event):
+                info = self.app.library.get(event.target.value)
+                if info is None:
+                    return
+                library_info.content = (
+                    f"**{info['path']}**  \n"
+                    f"{info['duration']:.2f}s, {info['keyframe_count']} keyframes, {info['interpolation_method']}  \n"
+                    f"{len(info['joints'])} joints, base z {info['base_height_min']}–{info['base_height_max']}"
+                )
+
+            @refresh_library_btn.on_click
+            def _(_):
+                stats = self.app.library.refresh()
+                update_results()
+                print(
+                    f"[green]Library refreshed:[/green] {stats['added']} added, {stats['updated']} updated, "
+                    f"{stats['removed']} removed, {stats['unchanged']} unchanged"
+                )
+
+            for control in (library_search, library_joint, library_min_duration, library_max_duration):
+                control.on_update(new_search)
+
+            @load_clip_btn.on_click
+            def _(_):
+                path = library_results.value
+                if path == "None":
+                    return
+                try:
+                    self.app.animator = self.app.library.load(path)
+                    self.file_name_input.value = self.app.library.full_path(path)
+                    self.refresh_animation_widgets()
+                    print(f"[green]Loaded animation from {path}[/green]")
+                except Exception as e:
+                    print(f"[red]Error loading: {e}[/red]")
+
+            update_results()
+
+        with self.server.gui.add_folder("Gait Generator"):
+            gait_dropdown = self.server.gui.add_dropdown("Gait", options=list(GAITS), initial_value="trot")
+            gait_period = self.server.gui.add_number("Period (s)", initial_value=0.5, min=0.1, max=5.0, step=0.05)
+            gait_duty = self.server.gui.add_slider(
+                "Duty Factor", min=0.1, max=0.95, step=0.05, initial_value=GAITS["trot"]["duty"]
+            )
+            gait_step_height = self.server.gui.add_number(
+                "Step Height (m)", initial_value=0.08, min=0.0, max=0.3, step=0.01
+            )
+            gait_speed = self.server.gui.add_number("Speed (m/s)", initial_value=0.4, min=0.0, max=3.0, step=0.05)
+            gait_body_height = self.server.gui.add_number(
+                "Body Height (m)", initial_value=0.3, min=0.1, max=1.0, step=0.01
+            )
+            gait_cycles = self.server.gui.add_number("Cycles", initial_value=2, min=1, max=20, step=1)
+            generate_gait_btn = self.server.gui.add_button("Generate To Timeline", icon=viser.Icon.WALK)
+
+            @gait_dropdown.on_update
+            def _(event):
+                gait_duty.value = GAITS[event.target.value]["duty"]
+
+            @generate_gait_btn.on_click
+            def _(_):
+                params = GaitParams(
+                    gait=gait_dropdown.value,
+                    period=gait_period.value,
+                    duty=gait_duty.value,
+                    step_height=gait_step_height.value,
+                    speed=gait_speed.value,
+                    body_height=gait_body_height.value,
+                    cycles=int(gait_cycles.value),
+                )
+                robot_cfg = self.app.robot.cfg
+                animator = Animator()
+                animator.load_from_dict(generate_gait(params, robot_cfg.thigh_len, robot_cfg.calf_len))
+                self.app.animator = animator
+                self.refresh_animation_widgets()
+                print(f"[green]Generated {params.gait} gait ({animator.duration:.2f}s)[/green]")
+
+        with self.server.gui.add_folder("Blend"):
+            clip_a_input = self.server.gui.add_text("Clip A", initial_value="animation.json")
+            clip_b_input = self.server.gui.add_text("Clip B", initial_value="animation.json")
+            blend_mode_dropdown = self.server.gui.add_dropdown(
+                "Blend Mode", options=["Crossfade", "Blend", "Additive"], initial_value="Crossfade"
+            )
+            blend_amount_number = self.server.gui.add_number(
+                "Overlap (s) / Weight", initial_value=0.5, min=0.0, max=10.0, step=0.05
+            )
+            bake_fps_number = self.server.gui.add_number("Bake FPS", initial_value=30, min=1, max=240, step=1)
+            preview_blend_btn = self.server.gui.add_button("Preview On Ghost", icon=viser.Icon.EYE)
+            bake_blend_btn = self.server.gui.add_button("Bake To Timeline", icon=viser.Icon.LAYERS_INTERSECT)
+            discard_blend_btn = self.server.gui.add_button("Discard Preview", icon=viser.Icon.X)
+
+            def build_blend():
+                """按当前参数从文件构建 ClipBlender，读取失败时返回 None。"""
+                try:
+                    clip_a = Animator()
+                    clip_a.load_from_file(clip_a_input.value)
+                    clip_b = Animator()
+                    clip_b.load_from_file(clip_b_input.value)
+                except Exception as e:
+                    print(f"[red]Error loading clips: {e}[/red]")
+                    return None
+
+                mode = blend_mode_dropdown.value
+                amount = blend_amount_number.value
+                if mode == "Crossfade":
+                    return crossfade(clip_a, clip_b, amount)
+                # 作为权重使用时限制在 [0, 1]，超出会把关节外推到两段片段之外
+                weight = float(np.clip(amount, 0.0, 1.0))
+                layer_mode = "blend" if mode == "Blend" else "additive"
+                return ClipBlender([ClipLayer(clip_a), ClipLayer(clip_b, mode=layer_mode, weight=weight, loop=True)])
+
+            @preview_blend_btn.on_click
+            def _(_):
+                blender = build_blend()
+                if blender is None:
+                    return
+                # ClipBlender 与 Animator 有相同的 get_state_at_time，Ghost 直接逐帧求值，不必先烘焙
+                self.preview_animator = blender
+                self.app.ghost_robot.set_visible(True)
+                self.update_ghost_pose(self.app.state.snapshot().time)
+                print(f"[green]Previewing {blend_mode_dropdown.value.lower()} on ghost[/green]")
+
+            @bake_blend_btn.on_click
+            def _(_):
+                # 与 Apply To Clip 相同，总是按当前参数重新构建
+                blender = build_blend()
+                if blender is None:
+                    return
+                self.app.animator = blender.bake(fps=bake_fps_number.value)
+                self.preview_animator = None
+                self.app.ghost_robot.set_visible(self.show_ghost_checkbox.value)
+                self.refresh_animation_widgets()
+                self.scrub_to(self.app.state.snapshot().time)
+                print(
+                    f"[green]Baked {blend_mode_dropdown.value.lower()} of {clip_a_input.value} "
+                    f"and {clip_b_input.value}[/green]"
+                )
+
+            @discard_blend_btn.on_click
+            def _(_):
+                self.preview_animator = None
+                self.app.ghost_robot.set_visible(self.show_ghost_checkbox.value)
+                self.update_ghost_pose(self.app.state.snapshot().time)
+
+    def refresh_animation_widgets(self):
+        self.duration_number.value = self.app.animator.duration
+        self.interp_dropdown.value = self.app.animator.interpolation_method
+        self.update_keyframe_dropdown()
+
+    def scrub_to(self, t):
+        """跳转到时间 t。只提交请求，快速拖动时中间的时刻会被合并掉。"""
+        self._scrub_worker.submit(t)
+
+    def _scrub(self, t):
+        """求值动画并把结果作为一个完整快照发布，由主循环渲染。"""
+        if self.app.state.snapshot().playing:
+            # 请求排队期间已开始播放，时间由播放循环接管
+            return
+        if self.app.animator.keyframes:
+            pose, b_pos, b_rpy = self.app.animator.get_state_at_time(t)
+            snap = self.app.state.update(time=t, pose=pose, base_pos=b_pos, base_rpy=b_rpy)
+            self.sync_sliders(snap.pose, snap.base_pos, snap.base_rpy)
+            self.update_ghost_pose(t)
+        else:
+            self.app.state.update(time=t)
+
     def update_play_pause_buttons(self):
-        playing = self.app.gui_state["playing"]
+        playing = self.app.state.snapshot().playing
         self.play_button.visible = not playing
         self.pause_button.visible = playing
 
     def update_time_slider(self, time_val):
         self.time_slider.value = time_val
 
-    def update_keyframe_dropdown(self):
-        if not self.app.animator.keyframes:
-            self.keyframe_selector.options = ["None"]
-            self.keyframe_selector.value = "None"
+    def update_keyframe_dropdown(self, select_id=None):
+        """
+        刷新关键帧浏览器。select_id 给定时翻到该关键帧所在的页并选中它。
+        只有当前页的选项真正变化时才重发给客户端，因此在其他页增删关键帧的代价与总数无关。
+        """
+        animator = self.app.animator
+        ids = animator.keyframe_ids()
+        size = self.KEYFRAME_PAGE_SIZE
+        pages = max(1, -(-len(ids) // size))
+
+        if select_id is not None and select_id in ids:
+            self.keyframe_page = ids.index(select_id) // size
+        self.keyframe_page = min(max(self.keyframe_page, 0), pages - 1)
+
+        start = self.keyframe_page * size
+        rows = animator.keyframes[start : start + size]
+        # 标签与时间轴一致显示播放时间 (关键帧存的是源时间)
+        times = np.atleast_1d(animator.unwarp_time(np.array([k["time"] for k in rows], dtype=float)))
+        labels = [f"#{k['id']}  {t:.3f}s" for k, t in zip(rows, times)]
+        self._keyframe_labels = dict(zip(labels, ids[start : start + size]))
+
+        options = labels or ["None"]
+        if options != self._sent_keyframe_options:
+            self.keyframe_selector.options = options
+            self._sent_keyframe_options = options
+        if select_id is not None and select_id in ids:
+            self.keyframe_selector.value = labels[ids.index(select_id) - start]
+        elif self.keyframe_selector.value not in options:
+            self.keyframe_selector.value = options[0]
+
+        info = f"Count: {len(ids)}  (page {self.keyframe_page + 1}/{pages})"
+        if self.keyframe_info.value != info:
+            self.keyframe_info.value = info
+        self._update_keyframe_markers()
+
+    def selected_keyframe_id(self):
+        return self._keyframe_labels.get(self.keyframe_selector.value)
+
+    def _keyframe_index_hint(self, keyframe_id):
+        """当前页中该 id 的下标，供 Animator.find_keyframe 直接命中。"""
+        labels = list(self._keyframe_labels.values())
+        if keyframe_id not in labels:
+            return None
+        return self.keyframe_page * self.KEYFRAME_PAGE_SIZE + labels.index(keyframe_id)
+
+    def _update_keyframe_markers(self):
+        """把所有关键帧 (播放时间) 分箱后画成一条 SVG 分布条，高亮当前页范围和选中的关键帧。"""
+        animator = self.app.animator
+        duration = max(animator.duration, 1e-6)
+        times = np.asarray(animator.unwarp_time(np.array([k["time"] for k in animator.keyframes])), dtype=float)
+        bins = self.MARKER_BINS
+        counts, _ = np.histogram(times, bins=bins, range=(0.0, duration))
+
+        size = self.KEYFRAME_PAGE_SIZE
+        page_times = times[self.keyframe_page * size : (self.keyframe_page + 1) * size]
+        page_span = (float(page_times[0]), float(page_times[-1])) if len(page_times) else None
+
+        selected = None
+        keyframe_id = self.selected_keyframe_id()
+        if keyframe_id is not None:
+            idx = animator.find_keyframe(keyframe_id, hint=self._keyframe_index_hint(keyframe_id))
+            if idx is not None:
+                selected = float(times[idx])
+
+        key = (counts.tobytes(), page_span, selected, duration)
+        if key == self._sent_marker_key:
             return
-        options = [f"{k['time']:.2f}s" for k in self.app.animator.keyframes]
-        self.keyframe_selector.options = options
+        self._sent_marker_key = key
+
+        width, height = 300.0, 24.0
+        scale = width / duration
+        parts = [f'<svg viewBox="0 0 {width:.0f} {height:.0f}" width="100%" height="{height:.0f}">']
+        if page_span is not None:
+            x0, x1 = page_span[0] * scale, page_span[1] * scale
+            parts.append(
+                f'<rect x="{x0:.1f}" y="0" width="{max(x1 - x0, 1.0):.1f}" height="{height:.0f}" fill="#4dabf7" '
+                'fill-opacity="0.2"/>'
+            )
+        peak = max(int(counts.max()), 1) if len(counts) else 1
+        bin_width = width / bins
+        for i in np.flatnonzero(counts):
+            h = height * (0.35 + 0.65 * counts[i] / peak)
+            parts.append(
+                f'<rect x="{i * bin_width:.1f}" y="{height - h:.1f}" width="{max(bin_width - 0.5, 0.5):.1f}" '
+                f'height="{h:.1f}" fill="#868e96"/>'
+            )
+        if selected is not None:
+            x = selected * scale - 1.0
+            parts.append(f'<rect x="{x:.1f}" y="0" width="2" height="{height:.0f}" fill="#fa5252"/>')
+        parts.append("</svg>")
+        self.keyframe_markers.content = "".join(parts)
+
+    @staticmethod
+    def _set_slider(slider, value):
+        # 值未变化时不发送更新
+        if slider.value != value:
+            slider.value = value
 
     def sync_sliders(self, pose=None, b_pos=None, b_rpy=None):
         if pose:
             for name, val in pose.items():
                 if name in self.joint_sliders:
-                    self.joint_sliders[name].value = val
+                    self._set_slider(self.joint_sliders[name], val)
 
         if b_pos:
             for i, axis in enumerate(["x", "y", "z"]):
-                self.base_sliders[f"pos_{axis}"].value = b_pos[i]
+                self._set_slider(self.base_sliders[f"pos_{axis}"], b_pos[i])
 
         if b_rpy:
             for i, axis in enumerate(["roll", "pitch", "yaw"]):
-                self.base_sliders[f"rot_{axis}"].value = b_rpy[i]
+                self._set_slider(self.base_sliders[f"rot_{axis}"], b_rpy[i])
 
     def update_ghost_pose(self, t):
+        self._ghost_worker.submit(t)
+
+    def _update_ghost(self, t):
+        preview = self.preview_animator
+        if preview is not None:
+            # 预览片段变换: Ghost 与主机器人同一时刻对比
+            g_pose, g_b_pos, g_b_rpy = preview.get_state_at_time(t)
+            self.app.ghost_robot.update_pose(g_pose)
+            self.app.ghost_robot.update_base(g_b_pos, g_b_rpy)
+            return
+
         if not self.show_ghost_checkbox.value:
             return
 
         target_time = t
         if self.ghost_mode_dropdown.value == "Time Offset":
             target_time = t + self.ghost_offset_slider.value
-            if self.app.gui_state["loop"] and self.app.gui_state["duration"] > 0:
-                target_time %= self.app.gui_state["duration"]
+            snap = self.app.state.snapshot()
+            if snap.loop and snap.duration > 0:
+                target_time %= snap.duration
         else:  # Previous Keyframe
             prev_time = None
             sorted_keys = sorted(self.app.animator.keyframes, key=lambda x: x["time"])
+            # 关键帧时间是源时间，需映射回播放时间再比较
+            key_times = self.app.animator.unwarp_time(np.array([k["time"] for k in sorted_keys]))
             epsilon = 0.001
-            candidates = [k for k in sorted_keys if k["time"] < t - epsilon]
+            candidates = [kt for kt in key_times if kt < t - epsilon]
 
             if candidates:
-                prev_time = candidates[-1]["time"]
+                prev_time = candidates[-1]
             else:
-                if self.app.gui_state["loop"] and sorted_keys:
-                    prev_time = sorted_keys[-1]["time"]
+                if self.app.state.snapshot().loop and sorted_keys:
+                    prev_time = key_times[-1]
                 else:
                     prev_time = t
             target_time = prev_time
@@ -443,27 +951,19 @@ class GUI:
         if source_side == "R":
             pairs = [("FR", "FL"), ("RR", "RL")]
 
+        pose = self.app.state.snapshot().pose
+        mirrored = {}
         for src_leg, tgt_leg in pairs:
             # Hip: Negate
             src_hip = f"{src_leg}_hip"
-            tgt_hip = f"{tgt_leg}_hip"
-            if src_hip in self.app.current_pose:
-                val = -self.app.current_pose[src_hip]
-                self.app.current_pose[tgt_hip] = val
-
-            # Thigh: Copy
-            src_thigh = f"{src_leg}_thigh"
-            tgt_thigh = f"{tgt_leg}_thigh"
-            if src_thigh in self.app.current_pose:
-                val = self.app.current_pose[src_thigh]
-                self.app.current_pose[tgt_thigh] = val
-
-            # Calf: Copy
-            src_calf = f"{src_leg}_calf"
-            tgt_calf = f"{tgt_leg}_calf"
-            if src_calf in self.app.current_pose:
-                val = self.app.current_pose[src_calf]
-                self.app.current_pose[tgt_calf] = val
-
-        self.app.robot.update_pose(self.app.current_pose)
-        self.sync_sliders(pose=self.app.current_pose)
+            if src_hip in pose:
+                mirrored[f"{tgt_leg}_hip"] = -pose[src_hip]
+
+            # Thigh / Calf: Copy
+            for j in ["thigh", "calf"]:
+                src_name = f"{src_leg}_{j}"
+                if src_name in pose:
+                    mirrored[f"{tgt_leg}_{j}"] = pose[src_name]
+
+        snap = self.app.state.update_pose(mirrored)
+        self.sync_sliders(pose=snap.pose)
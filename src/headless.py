@@ -0,0 +1,67 @@
+import time
+
+import hydra
+import numpy as np
+from omegaconf import DictConfig
+from rich import print
+
+from animator import Animator
+from robot import Robot
+from scene import NullSceneBackend, RecordingSceneBackend
+
+
+def play_clip(robot, animator, fps=60.0, duration=None):
+    """
+    以固定帧率逐帧回放整个片段 (不等待真实时间)，返回回放的帧数。
+    """
+    duration = animator.duration if duration is None else duration
+    times = np.arange(0.0, duration + 0.5 / fps, 1.0 / fps)
+
+    # 整段一次采样，再按机器人的关节顺序重排，逐帧直接走数组路径
+    s = animator.sample(times)
+    order = robot.array_order(s.joint_names)
+    if order is not None:
+        joints = s.joints[:, order]
+    else:
+        joints = np.stack([robot.pose_vector(dict(zip(s.joint_names, row))).copy() for row in s.joints])
+    base_rpy = s.base_rot.as_euler("xyz", degrees=False)
+
+    for i in range(len(times)):
+        robot.update_pose(joints[i])
+        robot.update_base(s.base_pos[i], base_rpy[i])
+    return len(times)
+
+
+@hydra.main(version_base=None, config_path="../config", config_name="config")
+def main(cfg: DictConfig):
+    headless_cfg = cfg.headless
+    scene = RecordingSceneBackend() if headless_cfg.backend == "record" else NullSceneBackend()
+
+    robot = Robot(scene, cfg.robot)
+    robot.setup()
+
+    animator = Animator()
+    animator.load_from_file(headless_cfg.clip)
+
+    # 只统计回放阶段产生的消息
+    if isinstance(scene, RecordingSceneBackend):
+        scene.clear()
+
+    start = time.perf_counter()
+    frames = play_clip(robot, animator, fps=headless_cfg.fps)
+    elapsed = time.perf_counter() - start
+
+    print(
+        f"[green]Played[/green] [bold]{headless_cfg.clip}[/bold]: {frames} frames in {elapsed * 1000:.1f} ms "
+        f"({frames / elapsed:.0f} fps)"
+    )
+    if isinstance(scene, RecordingSceneBackend):
+        counts = scene.counts()
+        total = sum(counts.values())
+        print(f"Scene messages: {total} ({total / frames:.1f} per frame)")
+        for op, count in sorted(counts.items()):
+            print(f"  {op}: {count}")
+
+
+if __name__ == "__main__":
+    main()
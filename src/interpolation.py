@@ -0,0 +1,210 @@
+import numpy as np
+from scipy.interpolate import make_interp_spline
+
+
+class PiecewisePolynomial:
+    """
+    所有通道共用一组断点的分段多项式。
+    breaks: (S + 1,) 递增断点
+    coeffs: (S, order, C)，coeffs[i, k] 是第 i 段上 (t - breaks[i]) ** (order - 1 - k) 的系数 (高次在前)
+
+    求值只需一次 searchsorted 定位段，再做一遍 Horner；超出范围时沿首/尾段多项式外推。
+    """
+
+    def __init__(self, breaks, coeffs):
+        self.breaks = np.asarray(breaks, dtype=float)
+        self.coeffs = np.asarray(coeffs, dtype=float)
+
+    @property
+    def order(self):
+        return self.coeffs.shape[1]
+
+    @property
+    def channels(self):
+        return self.coeffs.shape[2]
+
+    def __call__(self, t):
+        t = np.asarray(t, dtype=float)
+        flat = np.atleast_1d(t).ravel()
+        idx = np.clip(np.searchsorted(self.breaks, flat, side="right") - 1, 0, len(self.coeffs) - 1)
+        dt = (flat - self.breaks[idx])[:, None]
+        c = self.coeffs[idx]  # (N, order, C)
+
+        out = c[:, 0]
+        for k in range(1, self.order):
+            out = out * dt + c[:, k]
+        return out.reshape(t.shape + (self.channels,))
+
+
+def constant(times, values):
+    """阶梯插值 (对应 interp1d 的 "zero")，最后一个关键帧的值一直保持到之后。"""
+    breaks = np.append(times, np.inf)
+    return PiecewisePolynomial(breaks, np.asarray(values, dtype=float)[:, None, :])
+
+
+def linear(times, values):
+    times = np.asarray(times, dtype=float)
+    values = np.asarray(values, dtype=float)
+    slopes = np.diff(values, axis=0) / np.diff(times)[:, None]
+    return PiecewisePolynomial(times, np.stack([slopes, values[:-1]], axis=1))
+
+
+def _cubic_segments(times, values, m0, m1):
+    """由每段起点/终点的值与切线 (m0, m1: (S, C)) 构造三次 Hermite 段。"""
+    times = np.asarray(times, dtype=float)
+    values = np.asarray(values, dtype=float)
+    h = np.diff(times)[:, None]
+    p0, p1 = values[:-1], values[1:]
+    a = (2.0 * (p0 - p1) + h * (m0 + m1)) / h**3
+    b = (3.0 * (p1 - p0) - h * (2.0 * m0 + m1)) / h**2
+    return PiecewisePolynomial(times, np.stack([a, b, m0, p0], axis=1))
+
+
+def hermite(times, values, tangents_in, tangents_out):
+    """
+    三次 Hermite，每个关键帧有独立的入/出切线 (K, C)。
+    第 i 段使用关键帧 i 的出切线和关键帧 i + 1 的入切线。
+    """
+    tangents_in = np.asarray(tangents_in, dtype=float)
+    tangents_out = np.asarray(tangents_out, dtype=float)
+    return _cubic_segments(times, values, tangents_out[:-1], tangents_in[1:])
+
+
+def catmull_rom_tangents(times, values):
+    """Catmull-Rom 切线: 内部点用中心差分，端点用单侧差分。"""
+    times = np.asarray(times, dtype=float)
+    values = np.asarray(values, dtype=float)
+    tangents = np.empty_like(values)
+    tangents[1:-1] = (values[2:] - values[:-2]) / (times[2:] - times[:-2])[:, None]
+    tangents[0] = (values[1] - values[0]) / (times[1] - times[0])
+    tangents[-1] = (values[-1] - values[-2]) / (times[-1] - times[-2])
+    return tangents
+
+
+def catmull_rom(times, values):
+    tangents = catmull_rom_tangents(times, values)
+    return hermite(times, values, tangents, tangents)
+
+
+def ease(times, values):
+    """每个关键帧处切线为零：在每个关键帧上缓入缓出。"""
+    zeros = np.zeros_like(np.asarray(values, dtype=float))
+    return hermite(times, values, zeros, zeros)
+
+
+def spline(times, values, k):
+    """
+    插值 B 样条 (与 interp1d 的 "quadratic" / "cubic" 相同)，转换为分段多项式。
+    样条在相邻节点之间是多项式，因此在每个节点处取右导数即得到该段的 Taylor 系数。
+    """
+    times = np.asarray(times, dtype=float)
+    k = min(k, len(times) - 1)
+    spl = make_interp_spline(times, np.asarray(values, dtype=float), k=k)
+    breaks = np.unique(spl.t[k : len(spl.t) - k])
+    starts = breaks[:-1]
+    factorial = 1.0
+    coeffs = []
+    for m in range(k + 1):
+        if m > 0:
+            factorial *= m
+        coeffs.append(spl(starts, nu=m) / factorial)
+    return PiecewisePolynomial(breaks, np.stack(coeffs[::-1], axis=1))
+
+
+# ---- 四元数 (scipy 顺序 x, y, z, w) ----
+
+
+def quat_mul(q1, q2):
+    x1, y1, z1, w1 = np.moveaxis(q1, -1, 0)
+    x2, y2, z2, w2 = np.moveaxis(q2, -1, 0)
+    return np.stack(
+        [
+            w1 * x2 + x1 * w2 + y1 * z2 - z1 * y2,
+            w1 * y2 - x1 * z2 + y1 * w2 + z1 * x2,
+            w1 * z2 + x1 * y2 - y1 * x2 + z1 * w2,
+            w1 * w2 - x1 * x2 - y1 * y2 - z1 * z2,
+        ],
+        axis=-1,
+    )
+
+
+def quat_conj(q):
+    return q * np.array([-1.0, -1.0, -1.0, 1.0])
+
+
+def quat_log(q):
+    """单位四元数的对数，返回旋转向量的一半 (3,)。"""
+    v = q[..., :3]
+    norm = np.linalg.norm(v, axis=-1, keepdims=True)
+    angle = np.arctan2(norm, q[..., 3:])
+    scale = np.divide(angle, norm, out=np.ones_like(norm), where=norm > 1e-12)
+    return v * scale
+
+
+def quat_exp(v):
+    norm = np.linalg.norm(v, axis=-1, keepdims=True)
+    scale = np.divide(np.sin(norm), norm, out=np.ones_like(norm), where=norm > 1e-12)
+    return np.concatenate([v * scale, np.cos(norm)], axis=-1)
+
+
+def quat_slerp(q0, q1, u, shortest=True):
+    """逐行球面插值: q0, q1 (N, 4)，u (N,)。"""
+    dot = np.sum(q0 * q1, axis=-1)
+    if shortest:
+        q1 = np.where((dot < 0)[:, None], -q1, q1)
+        dot = np.abs(dot)
+    theta = np.arccos(np.clip(dot, -1.0, 1.0))
+    sin_theta = np.sin(theta)
+    small = sin_theta < 1e-6
+    safe = np.where(small, 1.0, sin_theta)
+    w0 = np.where(small, 1.0 - u, np.sin((1.0 - u) * theta) / safe)
+    w1 = np.where(small, u, np.sin(u * theta) / safe)
+    q = w0[:, None] * q0 + w1[:, None] * q1
+    return q / np.linalg.norm(q, axis=-1, keepdims=True)
+
+
+class QuaternionCurve:
+    """
+    基座旋转曲线。
+    mode: "step" | "slerp" | "squad"；时间超出关键帧范围时保持首/尾姿态。
+    """
+
+    def __init__(self, times, quats, mode="slerp"):
+        if mode not in ("step", "slerp", "squad"):
+            raise ValueError(f"Unknown rotation mode: {mode}")
+        self.times = np.asarray(times, dtype=float)
+        self.mode = mode
+
+        # 相邻关键帧放到同一半球，保证走最短弧
+        quats = np.array(quats, dtype=float)
+        for i in range(1, len(quats)):
+            if np.dot(quats[i - 1], quats[i]) < 0:
+                quats[i] = -quats[i]
+        self.quats = quats
+
+        if mode == "squad":
+            self.inner = quats.copy()
+            if len(quats) > 2:
+                q = quats[1:-1]
+                q_inv = quat_conj(q)
+                log_next = quat_log(quat_mul(q_inv, quats[2:]))
+                log_prev = quat_log(quat_mul(q_inv, quats[:-2]))
+                self.inner[1:-1] = quat_mul(q, quat_exp(-(log_next + log_prev) / 4.0))
+
+    def __call__(self, t):
+        t = np.atleast_1d(np.asarray(t, dtype=float))
+        t = np.clip(t, self.times[0], self.times[-1])
+        idx = np.clip(np.searchsorted(self.times, t, side="right") - 1, 0, len(self.times) - 1)
+
+        if self.mode == "step" or len(self.times) == 1:
+            return self.quats[idx]
+
+        idx = np.minimum(idx, len(self.times) - 2)
+        u = (t - self.times[idx]) / (self.times[idx + 1] - self.times[idx])
+        q0, q1 = self.quats[idx], self.quats[idx + 1]
+        if self.mode == "slerp":
+            return quat_slerp(q0, q1, u)
+
+        outer = quat_slerp(q0, q1, u, shortest=False)
+        inner = quat_slerp(self.inner[idx], self.inner[idx + 1], u, shortest=False)
+        return quat_slerp(outer, inner, 2.0 * u * (1.0 - u), shortest=False)
@@ -0,0 +1,264 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from animator import Animator
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS clips (
+    path TEXT PRIMARY KEY,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    hash TEXT NOT NULL,
+    duration REAL,
+    keyframe_count INTEGER,
+    joints TEXT,
+    interpolation_method TEXT,
+    base_height_min REAL,
+    base_height_max REAL,
+    base_travel REAL,
+    joint_stats TEXT,
+    indexed_at REAL
+);
+CREATE INDEX IF NOT EXISTS clips_duration ON clips (duration);
+CREATE INDEX IF NOT EXISTS clips_hash ON clips (hash);
+-- 不是动画片段的 *.json，记录 mtime/size 以免每次刷新都重新读取
+CREATE TABLE IF NOT EXISTS ignored (
+    path TEXT PRIMARY KEY,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+"""
+
+
+def summarize_clip(data):
+    """
+    从已解析的动画 JSON 计算索引中的摘要信息；不是动画文件时返回 None。
+    """
+    keyframes = data.get("keyframes") if isinstance(data, dict) else None
+    if not isinstance(keyframes, list):
+        return None
+
+    joints = list(keyframes[0]["pose"].keys()) if keyframes else []
+    summary = {
+        "duration": float(data.get("duration", 2.0)),
+        "keyframe_count": len(keyframes),
+        "joints": joints,
+        "interpolation_method": data.get("interpolation_method", "linear"),
+        "base_height_min": None,
+        "base_height_max": None,
+        "base_travel": None,
+        "joint_stats": {},
+    }
+    if keyframes:
+        values = np.array([[k["pose"].get(name, 0.0) for name in joints] for k in keyframes], dtype=float)
+        base_pos = np.array([k["base"]["pos"] for k in keyframes], dtype=float)
+        summary["base_height_min"] = float(base_pos[:, 2].min())
+        summary["base_height_max"] = float(base_pos[:, 2].max())
+        summary["base_travel"] = float(np.linalg.norm(base_pos[-1, :2] - base_pos[0, :2]))
+        summary["joint_stats"] = {
+            name: [float(values[:, i].min()), float(values[:, i].max()), float(values[:, i].mean())]
+            for i, name in enumerate(joints)
+        }
+    return summary
+
+
+class AnimationLibrary:
+    """
+    基于 SQLite 的动画片段索引。
+    refresh() 按 mtime/size 增量扫描 root 下的 *.json，内容变化时再用哈希确认；
+    search() 只查询索引，load() 在选中时才解析对应文件。
+    """
+
+    def __init__(self, root, index_path):
+        self.root = os.path.abspath(root)
+        self.index_path = os.path.abspath(index_path)
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        # viser 回调运行在多个线程上，共用一个连接并用锁串行化
+        self._conn = sqlite3.connect(self.index_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        # 同一时间只允许一次 refresh，它的文件读取和解析不占用 _lock
+        self._refresh_lock = threading.Lock()
+
+    def _scan(self):
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = [d for d in dirnames if not d.startswith(".") and d != "__pycache__"]
+            for filename in filenames:
+                if filename.endswith(".json"):
+                    yield os.path.join(dirpath, filename)
+
+    def refresh(self):
+        """
+        增量更新索引。扫描、哈希和解析都在锁外进行，只有最后写入索引时持锁，刷新期间搜索不会被阻塞。
+        Returns: {"added": n, "updated": n, "removed": n, "unchanged": n}
+        """
+        stats = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0}
+        with self._refresh_lock:
+            with self._lock:
+                known = {
+                    row["path"]: row
+                    for row in self._conn.execute("SELECT path, mtime, size, hash FROM clips").fetchall()
+                }
+                known_ignored = {
+                    row["path"]: (row["mtime"], row["size"])
+                    for row in self._conn.execute("SELECT path, mtime, size FROM ignored").fetchall()
+                }
+            seen = set()
+            touched = []  # (mtime, size, path)
+            rows = []  # clips 表的整行
+            ignored = []  # (path, mtime, size)，每次刷新整体重写
+
+            for full_path in self._scan():
+                rel_path = os.path.relpath(full_path, self.root)
+                try:
+                    st = os.stat(full_path)
+                except OSError:
+                    continue
+                row = known.get(rel_path)
+                if row is not None and row["mtime"] == st.st_mtime and row["size"] == st.st_size:
+                    seen.add(rel_path)
+                    stats["unchanged"] += 1
+                    continue
+                if known_ignored.get(rel_path) == (st.st_mtime, st.st_size):
+                    ignored.append((rel_path, st.st_mtime, st.st_size))
+                    continue
+
+                try:
+                    with open(full_path, "rb") as f:
+                        content = f.read()
+                except OSError:
+                    continue
+                digest = hashlib.sha1(content).hexdigest()
+
+                if row is not None and row["hash"] == digest:
+                    # 只是被 touch 过，内容未变
+                    touched.append((st.st_mtime, st.st_size, rel_path))
+                    seen.add(rel_path)
+                    stats["unchanged"] += 1
+                    continue
+
+                try:
+                    summary = summarize_clip(json.loads(content))
+                except (ValueError, KeyError, IndexError, TypeError):
+                    summary = None
+                if summary is None:
+                    ignored.append((rel_path, st.st_mtime, st.st_size))
+                    continue
+
+                rows.append(
+                    (
+                        rel_path,
+                        st.st_mtime,
+                        st.st_size,
+                        digest,
+                        summary["duration"],
+                        summary["keyframe_count"],
+                        json.dumps(summary["joints"]),
+                        summary["interpolation_method"],
+                        summary["base_height_min"],
+                        summary["base_height_max"],
+                        summary["base_travel"],
+                        json.dumps(summary["joint_stats"]),
+                        time.time(),
+                    )
+                )
+                seen.add(rel_path)
+                stats["updated" if row is not None else "added"] += 1
+
+            removed = [path for path in known if path not in seen]
+            stats["removed"] = len(removed)
+
+            with self._lock, self._conn:
+                self._conn.executemany("UPDATE clips SET mtime = ?, size = ? WHERE path = ?", touched)
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO clips VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+                )
+                self._conn.executemany("DELETE FROM clips WHERE path = ?", [(path,) for path in removed])
+                self._conn.execute("DELETE FROM ignored")
+                self._conn.executemany("INSERT INTO ignored VALUES (?, ?, ?)", ignored)
+
+        return stats
+
+    @staticmethod
+    def _filters(text=None, min_duration=None, max_duration=None, interpolation_method=None, joint=None):
+        """search() / search_count() 共用的 WHERE 子句。Returns: (sql, params)"""
+        clauses, params = [], []
+        if text:
+            clauses.append("path LIKE ?")
+            params.append(f"%{text}%")
+        if min_duration is not None:
+            clauses.append("duration >= ?")
+            params.append(min_duration)
+        if max_duration is not None:
+            clauses.append("duration <= ?")
+            params.append(max_duration)
+        if interpolation_method:
+            clauses.append("interpolation_method = ?")
+            params.append(interpolation_method)
+        if joint:
+            clauses.append("joints LIKE ?")
+            params.append(f'%"{joint}"%')
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def search(
+        self,
+        text=None,
+        min_duration=None,
+        max_duration=None,
+        interpolation_method=None,
+        joint=None,
+        limit=100,
+        offset=0,
+    ):
+        """按条件过滤索引，返回字典列表 (按路径排序)；limit / offset 用于分页，总数见 search_count()。"""
+        where, params = self._filters(text, min_duration, max_duration, interpolation_method, joint)
+        query = "SELECT * FROM clips" + where + " ORDER BY path LIMIT ? OFFSET ?"
+        with self._lock:
+            rows = self._conn.execute(query, params + [limit, offset]).fetchall()
+        return [self._row_to_dict(row) for row in rows]
+
+    def search_count(self, text=None, min_duration=None, max_duration=None, interpolation_method=None, joint=None):
+        """与 search() 条件相同的匹配总数。"""
+        where, params = self._filters(text, min_duration, max_duration, interpolation_method, joint)
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM clips" + where, params).fetchone()[0]
+
+    def get(self, path):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM clips WHERE path = ?", (path,)).fetchone()
+        return self._row_to_dict(row) if row is not None else None
+
+    def get_by_hash(self, digest):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM clips WHERE hash = ?", (digest,)).fetchone()
+        return self._row_to_dict(row) if row is not None else None
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM clips").fetchone()[0]
+
+    def full_path(self, path):
+        return os.path.join(self.root, path)
+
+    def load(self, path):
+        """解析并返回选中的片段。"""
+        animator = Animator()
+        animator.load_from_file(self.full_path(path))
+        return animator
+
+    @staticmethod
+    def _row_to_dict(row):
+        info = dict(row)
+        info["joints"] = json.loads(info["joints"]) if info["joints"] else []
+        info["joint_stats"] = json.loads(info["joint_stats"]) if info["joint_stats"] else {}
+        return info
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,290 @@
+import hashlib
+import json
+import os
+import struct
+import threading
+import urllib.parse
+import urllib.request
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import hydra
+import numpy as np
+from omegaconf import DictConfig
+from rich import print
+
+from animator import Animator
+from library import AnimationLibrary
+
+# 响应格式 (小端):
+#   header: magic(4s) version(B) pad(x) joint_count(H) frame_count(I) names_len(I)
+#   names: names_len 字节的 UTF-8 JSON 关节名数组
+#   data: frame_count 行 float32，每行为 joints(joint_count) base_pos(3) base_wxyz(4)
+RESPONSE_MAGIC = b"RKPQ"
+RESPONSE_VERSION = 1
+RESPONSE_HEADER = struct.Struct("<4sBxHII")
+
+
+def encode_poses(samples):
+    names = json.dumps(list(samples.joint_names)).encode("utf-8")
+    wxyz = np.roll(samples.base_rot.as_quat(), 1, axis=1)  # scipy 为 xyzw
+    data = np.hstack([samples.joints, samples.base_pos, wxyz]).astype("<f4")
+    header = RESPONSE_HEADER.pack(RESPONSE_MAGIC, RESPONSE_VERSION, len(samples.joint_names), len(data), len(names))
+    return header + names + data.tobytes()
+
+
+def decode_poses(payload):
+    """
+    Returns: {"joint_names", "joints": (T, J), "base_pos": (T, 3), "base_wxyz": (T, 4)}
+    """
+    magic, version, joint_count, frame_count, names_len = RESPONSE_HEADER.unpack_from(payload)
+    if magic != RESPONSE_MAGIC or version != RESPONSE_VERSION:
+        raise ValueError("Not a pose query response")
+    offset = RESPONSE_HEADER.size
+    names = json.loads(payload[offset : offset + names_len].decode("utf-8"))
+    data = np.frombuffer(payload, dtype="<f4", offset=offset + names_len).reshape(frame_count, joint_count + 7)
+    return {
+        "joint_names": names,
+        "joints": data[:, :joint_count],
+        "base_pos": data[:, joint_count : joint_count + 3],
+        "base_wxyz": data[:, joint_count + 3 :],
+    }
+
+
+class ClipCache:
+    """
+    已解析且已构建插值曲线的片段的 LRU 缓存，按文件内容哈希索引：
+    同一内容的不同路径共用一份，文件修改后自然换成新条目。
+    """
+
+    def __init__(self, capacity=32):
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self._clips = OrderedDict()  # hash -> Animator
+        self._hashes = {}  # full_path -> (mtime, size, hash)，避免每次请求都重新读文件
+        self._lock = threading.Lock()
+
+    def _file_hash(self, full_path):
+        st = os.stat(full_path)
+        known = self._hashes.get(full_path)
+        if known is not None and known[:2] == (st.st_mtime, st.st_size):
+            return known[2], None
+        with open(full_path, "rb") as f:
+            content = f.read()
+        digest = hashlib.sha1(content).hexdigest()
+        self._hashes[full_path] = (st.st_mtime, st.st_size, digest)
+        return digest, content
+
+    def get(self, full_path):
+        """Returns: (hash, Animator)"""
+        with self._lock:
+            digest, content = self._file_hash(full_path)
+            animator = self._clips.get(digest)
+            if animator is not None:
+                self._clips.move_to_end(digest)
+                self.hits += 1
+                return digest, animator
+            self.misses += 1
+
+        # 解析和构建曲线放在锁外，不阻塞其他片段的查询
+        if content is None:
+            with open(full_path, "rb") as f:
+                content = f.read()
+        animator = Animator()
+        animator.load_from_dict(json.loads(content))
+        if animator.keyframes:
+            animator.sample([0.0])  # 预先构建插值曲线，之后的 sample() 只读，可被多个线程共用
+
+        with self._lock:
+            self._clips[digest] = animator
+            self._clips.move_to_end(digest)
+            while len(self._clips) > self.capacity:
+                self._clips.popitem(last=False)
+        return digest, animator
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._clips), "capacity": self.capacity, "hits": self.hits, "misses": self.misses}
+
+
+class PoseService:
+    """
+    本地 HTTP 批量姿态查询服务。
+
+    GET  /clips?q=...               -> JSON，动画库中的片段列表
+    GET  /stats                     -> JSON，缓存统计
+    POST /sample                    -> 二进制姿态数组 (格式见 encode_poses)
+         请求体为 JSON {"clip": id, "times": [...]}，
+         或 ?clip=id 加 application/octet-stream 的 float64 时间数组 (适合大批量)
+    clip id 为动画库中的相对路径或内容哈希。
+    """
+
+    def __init__(self, library, host="127.0.0.1", port=9871, cache_size=32):
+        self.library = library
+        self.cache = ClipCache(cache_size)
+        self.address = (host, port)
+        self._httpd = None
+        self._thread = None
+
+    def resolve(self, clip_id):
+        """clip id -> 文件绝对路径，只允许访问动画库根目录下的文件。"""
+        info = self.library.get_by_hash(clip_id)
+        rel_path = info["path"] if info is not None else clip_id
+        root = os.path.realpath(self.library.root)
+        full_path = os.path.realpath(self.library.full_path(rel_path))
+        if os.path.commonpath([full_path, root]) != root or not os.path.isfile(full_path):
+            raise KeyError(clip_id)
+        return full_path
+
+    def sample(self, clip_id, times):
+        digest, animator = self.cache.get(self.resolve(clip_id))
+        return digest, animator.sample(times)
+
+    def _make_handler(self):
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _send(self, code, body, content_type="application/json", headers=None):
+                if not isinstance(body, bytes):
+                    body = json.dumps(body).encode("utf-8")
+                self.send_response(code)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                url = urllib.parse.urlparse(self.path)
+                query = urllib.parse.parse_qs(url.query)
+                if url.path == "/clips":
+                    text = query.get("q", [None])[0]
+                    try:
+                        limit = int(query.get("limit", [1000])[0])
+                    except ValueError as e:
+                        self._send(400, {"error": f"Bad request: {e}"})
+                        return
+                    self._send(200, service.library.search(text=text, limit=limit))
+                elif url.path == "/stats":
+                    self._send(200, service.cache.stats())
+                else:
+                    self._send(404, {"error": f"Unknown path: {url.path}"})
+
+            def do_POST(self):
+                url = urllib.parse.urlparse(self.path)
+                if url.path != "/sample":
+                    self._send(404, {"error": f"Unknown path: {url.path}"})
+                    return
+
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                try:
+                    if self.headers.get("Content-Type") == "application/octet-stream":
+                        clip_id = urllib.parse.parse_qs(url.query)["clip"][0]
+                        times = np.frombuffer(body, dtype="<f8")
+                    else:
+                        request = json.loads(body)
+                        if not isinstance(request, dict):
+                            raise ValueError("request body must be a JSON object")
+                        clip_id = request["clip"]
+                        times = np.asarray(request["times"], dtype=float).reshape(-1)
+                    if not isinstance(clip_id, str):
+                        raise ValueError("clip must be a string")
+                except (KeyError, ValueError, TypeError) as e:
+                    self._send(400, {"error": f"Bad request: {e}"})
+                    return
+
+                try:
+                    full_path = service.resolve(clip_id)
+                except KeyError:
+                    self._send(404, {"error": f"Unknown clip: {clip_id}"})
+                    return
+                try:
+                    digest, animator = service.cache.get(full_path)
+                    samples = animator.sample(times)
+                except OSError as e:
+                    self._send(500, {"error": str(e)})
+                    return
+                except (KeyError, ValueError, TypeError, IndexError) as e:
+                    # 文件存在但内容不是合法的片段 (如关键帧缺少 "time")
+                    self._send(422, {"error": f"Malformed clip {clip_id}: {e!r}"})
+                    return
+                self._send(200, encode_poses(samples), "application/octet-stream", {"X-Clip-Hash": digest})
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        if self._httpd is not None:
+            return
+        self._httpd = ThreadingHTTPServer(self.address, self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="pose-service", daemon=True)
+        self._thread.start()
+        print(f"[green]Pose service listening on http://{self.address[0]}:{self._httpd.server_port}[/green]")
+
+    def stop(self):
+        if self._httpd is None:
+            return
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        self._thread.join()
+        self._httpd = None
+        self._thread = None
+
+    def join(self):
+        if self._thread is not None:
+            self._thread.join()
+
+    @property
+    def port(self):
+        return self._httpd.server_port if self._httpd is not None else self.address[1]
+
+
+class PoseClient:
+    """PoseService 的客户端，供训练 / 仿真进程直接使用。"""
+
+    def __init__(self, url="http://127.0.0.1:9871", timeout=10.0):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def _get(self, path):
+        with urllib.request.urlopen(self.url + path, timeout=self.timeout) as response:
+            return json.loads(response.read())
+
+    def clips(self, text=None):
+        return self._get("/clips" + (f"?q={urllib.parse.quote(text)}" if text else ""))
+
+    def stats(self):
+        return self._get("/stats")
+
+    def sample(self, clip_id, times):
+        request = urllib.request.Request(
+            f"{self.url}/sample?clip={urllib.parse.quote(clip_id)}",
+            data=np.asarray(times, dtype="<f8").tobytes(),
+            headers={"Content-Type": "application/octet-stream"},
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return decode_poses(response.read())
+
+
+@hydra.main(version_base=None, config_path="../config", config_name="config")
+def main(cfg: DictConfig):
+    library = AnimationLibrary(cfg.library.root, cfg.library.index)
+    stats = library.refresh()
+    print(f"Library: {library.count()} clips ({stats['added']} added, {stats['updated']} updated)")
+
+    service_cfg = cfg.service
+    service = PoseService(library, service_cfg.host, service_cfg.port, service_cfg.cache_size)
+    service.start()
+    try:
+        service.join()
+    except KeyboardInterrupt:
+        service.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,48 @@
-import viser
-from viser.extras import ViserUrdf
 import numpy as np
 import os
+import re
 from pathlib import Path
 from rich import print
 
 
 from omegaconf import DictConfig
 
+from scene import SceneBackend
+from urdf import load_actuated_joints
+
+# 几何体模式下足端小球的半径
+FOOT_RADIUS = 0.02
+
+
+def leg_mounts(body_dims):
+    """
+    四条腿的安装位置 (相对于躯干中心) 和左右侧 (+1 左 / -1 右)。
+    Returns: [{"name": "FL", "pos": (x, y, z), "side": 1}, ...]
+    """
+    dx = body_dims[0] / 2 - 0.05
+    dy = body_dims[1] / 2
+    return [
+        {"name": "FL", "pos": (dx, dy, 0), "side": 1},
+        {"name": "FR", "pos": (dx, -dy, 0), "side": -1},
+        {"name": "RL", "pos": (-dx, dy, 0), "side": 1},
+        {"name": "RR", "pos": (-dx, -dy, 0), "side": -1},
+    ]
+
+
+def short_joint_name(urdf_joint_name):
+    """URDF 关节名 -> 姿态字典中的键，例如 "FL_hip_joint" -> "FL_hip"。"""
+    return urdf_joint_name[: -len("_joint")] if urdf_joint_name.endswith("_joint") else urdf_joint_name
+
 
 class Robot:
-    def __init__(self, server: viser.ViserServer, cfg: DictConfig, name=None, opacity=1.0, use_urdf=True):
-        self.server = server
+    def __init__(self, scene: SceneBackend, cfg: DictConfig, name=None, opacity=1.0, use_urdf=True):
+        self.scene = scene
         self.cfg = cfg
         self.name = name if name is not None else cfg.name
         self.opacity = opacity
         self.use_urdf = use_urdf
         self.joints = {}  # 存储关节句柄 name -> frame_handle
+        self._geometric_axes = {}  # 几何体模式下各关节的旋转轴 name -> (x, y, z)
         self.urdf_loaded = False
         self.urdf_path = cfg.urdf_path
         self.fixed_urdf_path = cfg.fixed_urdf_path
@@ -29,12 +55,12 @@ class Robot:
         self.calf_len = cfg.calf_len
 
         # 关节限制 (弧度) - 仅作参考，可视化可以宽松些
-        self.limits = cfg.limits
+        self.limits = cfg.get("limits", {})
 
     def setup(self):
         # 1. 创建躯干 (Base)
         # 抬高一点以便腿能伸展
-        self.base = self.server.scene.add_frame(self.name, position=(0, 0, 0.4), show_axes=False)
+        self.base = self.scene.add_frame(self.name, position=(0, 0, 0.4), show_axes=False)
 
         # 尝试加载 URDF
         if self.use_urdf and os.path.exists(self.urdf_path):
@@ -43,8 +69,8 @@ class Robot:
                 with open(self.urdf_path, "r") as f:
                     urdf_content = f.read()
 
-                # 简单的字符串替换
-                fixed_content = urdf_content.replace("package://go2_description/", "../")
+                # package://<包名>/ 统一替换为相对路径
+                fixed_content = re.sub(r"package://[^/]+/", "../", urdf_content)
 
                 with open(self.fixed_urdf_path, "w") as f:
                     f.write(fixed_content)
@@ -60,8 +86,7 @@ class Robot:
                     # 使用淡红色半透明
                     color_override = (0.8, 0.5, 0.5, self.opacity)
 
-                self.viser_urdf = ViserUrdf(
-                    self.server,
+                self.viser_urdf = self.scene.add_urdf(
                     Path(self.fixed_urdf_path),
                     root_node_name=self.name,
                     mesh_color_override=color_override,
@@ -71,6 +96,7 @@ class Robot:
 
                 # 获取关节名称列表以便后续更新
                 self.joint_names = self.viser_urdf.get_actuated_joint_names()
+                self._build_joint_maps()
                 return
             except Exception as e:
                 print(f"[red]Failed to load URDF: {e}[/red]")
@@ -80,10 +106,90 @@ class Robot:
 
         # 如果没有 URDF，回退到几何体构建
         self._setup_geometric()
+        self._build_joint_maps()
+
+    def _build_joint_maps(self):
+        """
+        在 setup 时一次性确定关节顺序、旋转轴和限位，之后每帧只做数组运算。
+        pose_names 的顺序即 update_pose 接受的数组顺序；URDF 模式下与 URDF 可驱动关节顺序一致。
+        """
+        urdf_joints = {}
+        if os.path.exists(self.urdf_path):
+            try:
+                urdf_joints = {short_joint_name(j["name"]): j for j in load_actuated_joints(self.urdf_path)}
+            except Exception as e:
+                print(f"[yellow]Could not parse joints from URDF: {e}[/yellow]")
+
+        if self.urdf_loaded:
+            self.pose_names = [short_joint_name(name) for name in self.joint_names]
+            self._joint_frames = []
+        else:
+            self.pose_names = list(self.joints.keys())
+            self._joint_frames = [self.joints[name] for name in self.pose_names]
+
+        # 姿态键 (以及 URDF 完整关节名) -> 数组下标
+        self.pose_index = {name: i for i, name in enumerate(self.pose_names)}
+        if self.urdf_loaded:
+            self.pose_index.update({name: i for i, name in enumerate(self.joint_names)})
+
+        # 旋转轴: URDF 优先，否则使用几何模型构建时的轴
+        axes = []
+        self.joint_limits = {}
+        for name in self.pose_names:
+            urdf_joint = urdf_joints.get(name)
+            axes.append(urdf_joint["axis"] if urdf_joint else self._geometric_axes.get(name, (0.0, 1.0, 0.0)))
+
+            # 限位: 配置中按关节类型 (名称中第一个 "_" 之后的部分) 给出的优先，其次 URDF
+            joint_type = name.split("_", 1)[-1]
+            if joint_type in self.limits:
+                self.joint_limits[name] = tuple(self.limits[joint_type])
+            elif urdf_joint and urdf_joint["limit"]:
+                self.joint_limits[name] = urdf_joint["limit"]
+            else:
+                self.joint_limits[name] = (-np.pi, np.pi)
+
+        axes = np.array(axes, dtype=float).reshape(-1, 3)
+        self.joint_axes = axes / np.linalg.norm(axes, axis=1, keepdims=True)
+
+        # 每帧复用的缓冲区
+        self._pose_buffer = np.zeros(len(self.pose_names))
+        self._half_buffer = np.zeros(len(self.pose_names))
+        # 场景句柄会保留传入的四元数数组，两块缓冲区逐帧交替使用，
+        # 写入本帧时上一帧交给句柄的那一块保持不变，不必逐关节复制
+        self._quat_buffers = np.zeros((2, len(self.pose_names), 4))
+        self._quat_frame = 0
+
+    def joint_groups(self):
+        """按名称前缀 (第一个 "_" 之前，如 "FL") 分组的关节名，用于构建 GUI。"""
+        groups = {}
+        for name in self.pose_names:
+            prefix = name.split("_", 1)[0] if "_" in name else "Joints"
+            groups.setdefault(prefix, []).append(name)
+        return groups
+
+    def array_order(self, names):
+        """
+        names 顺序的关节数组 -> pose_names 顺序的下标，用法: values[robot.array_order(names)]。
+        names 中缺少任一关节时返回 None。
+        """
+        positions = {name: i for i, name in enumerate(names)}
+        if not all(name in positions for name in self.pose_names):
+            return None
+        return np.array([positions[name] for name in self.pose_names], dtype=int)
+
+    def pose_vector(self, joint_angles, out=None):
+        """姿态字典 -> pose_names 顺序的数组，缺失的关节为 0。"""
+        out = self._pose_buffer if out is None else out
+        out[:] = 0.0
+        for name, angle in joint_angles.items():
+            i = self.pose_index.get(name)
+            if i is not None:
+                out[i] = angle
+        return out
 
     def _setup_geometric(self):
         # 躯干几何体
-        self.server.scene.add_box(
+        self.scene.add_box(
             f"{self.name}/body_geom",
             dimensions=self.body_dims,
             color=(0.8, 0.8, 0.8),
@@ -93,31 +199,21 @@ class Robot:
 
         # 2. 创建四条腿
         # FL, FR, RL, RR
-        # 腿的安装位置 (相对于躯干中心)
-        dx = self.body_dims[0] / 2 - 0.05
-        dy = self.body_dims[1] / 2
-
-        leg_configs = [
-            {"name": "FL", "pos": (dx, dy, 0), "side": 1},
-            {"name": "FR", "pos": (dx, -dy, 0), "side": -1},
-            {"name": "RL", "pos": (-dx, dy, 0), "side": 1},
-            {"name": "RR", "pos": (-dx, -dy, 0), "side": -1},
-        ]
-
-        for config in leg_configs:
+        for config in leg_mounts(self.body_dims):
             self._create_leg(config["name"], config["pos"], config["side"])
 
     def _create_leg(self, name, pos, side):
         # 1. Hip Joint (侧摆) - 绕 X 轴旋转
         # 髋关节基座位置
         hip_base_name = f"{self.name}/{name}_hip"
-        hip_frame = self.server.scene.add_frame(
+        hip_frame = self.scene.add_frame(
             hip_base_name, position=pos, axes_length=0.1, axes_radius=0.005, show_axes=True
         )
         self.joints[f"{name}_hip"] = hip_frame
+        self._geometric_axes[f"{name}_hip"] = (1.0, 0.0, 0.0)
 
         # Hip 连杆几何体
-        self.server.scene.add_box(
+        self.scene.add_box(
             f"{hip_base_name}/geom",
             dimensions=(0.1, 0.04, 0.04),
             position=(0, side * self.hip_len / 2, 0),
@@ -128,14 +224,15 @@ class Robot:
         # 2. Thigh Joint (大腿) - 绕 Y 轴旋转
         # 连接在 Hip 的末端
         thigh_base_name = f"{hip_base_name}/thigh"
-        thigh_frame = self.server.scene.add_frame(
+        thigh_frame = self.scene.add_frame(
             thigh_base_name, position=(0, side * self.hip_len, 0), show_axes=True, axes_length=0.1, axes_radius=0.005
         )
         self.joints[f"{name}_thigh"] = thigh_frame
+        self._geometric_axes[f"{name}_thigh"] = (0.0, 1.0, 0.0)
 
         # Thigh 连杆几何体 (向下)
         # 假设初始状态是大腿垂直向下
-        self.server.scene.add_box(
+        self.scene.add_box(
             f"{thigh_base_name}/geom",
             dimensions=(0.04, 0.04, self.thigh_len),
             position=(0, 0, -self.thigh_len / 2),
@@ -146,13 +243,14 @@ class Robot:
         # 3. Calf Joint (小腿) - 绕 Y 轴旋转
         # 连接在 Thigh 的末端
         calf_base_name = f"{thigh_base_name}/calf"
-        calf_frame = self.server.scene.add_frame(
+        calf_frame = self.scene.add_frame(
             calf_base_name, position=(0, 0, -self.thigh_len), show_axes=True, axes_length=0.1, axes_radius=0.005
         )
         self.joints[f"{name}_calf"] = calf_frame
+        self._geometric_axes[f"{name}_calf"] = (0.0, 1.0, 0.0)
 
         # Calf 连杆几何体
-        self.server.scene.add_box(
+        self.scene.add_box(
             f"{calf_base_name}/geom",
             dimensions=(0.03, 0.03, self.calf_len),
             position=(0, 0, -self.calf_len / 2),
@@ -161,9 +259,9 @@ class Robot:
         )
 
         # 足端 (Foot)
-        self.server.scene.add_icosphere(
+        self.scene.add_icosphere(
             f"{calf_base_name}/foot",
-            radius=0.02,
+            radius=FOOT_RADIUS,
             position=(0, 0, -self.calf_len),
             color=(0.1, 0.1, 0.1),
             opacity=self.opacity,
@@ -174,7 +272,6 @@ class Robot:
         pos: [x, y, z]
         rpy: [roll, pitch, yaw]
         """
-        self.base.position = np.array(pos)
         # Euler to Quaternion (wxyz)
         # scipy Rotation is (x, y, z, w), viser uses (w, x, y, z)
         # We can implement simple conversion or use scipy if available
@@ -196,59 +293,37 @@ class Robot:
         y = cx * sy * cz + sx * cy * sz
         z = cx * cy * sz - sx * sy * cz
 
-        self.base.wxyz = np.array([w, x, y, z])
+        self.scene.set_transform(self.base, position=np.array(pos), wxyz=np.array([w, x, y, z]))
 
     def update_pose(self, joint_angles):
         """
-        joint_angles: dict { "FL_hip": rad, ... }
+        joint_angles: dict { "FL_hip": rad, ... }，或按 pose_names 顺序排列的 NumPy 数组
         """
+        if isinstance(joint_angles, np.ndarray):
+            q = joint_angles
+        else:
+            q = self.pose_vector(joint_angles)
+
         if self.urdf_loaded:
-            # 准备配置数组
-            # 映射: {name} -> {name}_joint
-            # 需要按照 self.joint_names 的顺序构建数组
-            cfg = []
-            for j_name in self.joint_names:
-                # j_name 类似于 "FL_hip_joint"
-                # 我们的 joint_angles 键是 "FL_hip"
-                # 尝试去掉 "_joint" 后缀来匹配
-                short_name = j_name.replace("_joint", "")
-                if short_name in joint_angles:
-                    cfg.append(joint_angles[short_name])
-                else:
-                    cfg.append(0.0)  # 默认值
-
-            self.viser_urdf.update_cfg(np.array(cfg))
+            self.scene.set_joint_cfg(self.viser_urdf, q)
             return
 
-        # 几何体模式
-        for name, angle in joint_angles.items():
-            if name not in self.joints:
-                continue
-
-            frame = self.joints[name]
-
-            # 根据关节类型确定旋转轴
-            # Hip: 绕 X 轴 (Roll)
-            # Thigh: 绕 Y 轴 (Pitch)
-            # Calf: 绕 Y 轴 (Pitch)
-
-            if "hip" in name:
-                # quaternion for x-axis rotation
-                frame.wxyz = self._angle_to_quat(angle, [1, 0, 0])
-            else:
-                # quaternion for y-axis rotation
-                frame.wxyz = self._angle_to_quat(angle, [0, 1, 0])
-
-    def _angle_to_quat(self, angle, axis):
-        # axis-angle to quaternion (w, x, y, z)
-        axis = np.array(axis)
-        axis = axis / np.linalg.norm(axis)
-        half_angle = angle / 2
-        s = np.sin(half_angle)
-        w = np.cos(half_angle)
-        x, y, z = axis * s
-        return np.array([w, x, y, z])
+        # 几何体模式: 一次算出所有关节的轴角四元数 (w, x, y, z)，全部写入预分配缓冲区
+        half = np.multiply(q, 0.5, out=self._half_buffer)
+        self._quat_frame ^= 1
+        quats = self._quat_buffers[self._quat_frame]
+        np.cos(half, out=quats[:, 0])
+        np.sin(half, out=half)
+        np.multiply(self.joint_axes, half[:, None], out=quats[:, 1:])
+        for frame, wxyz in zip(self._joint_frames, quats):
+            self.scene.set_transform(frame, wxyz=wxyz)
+
+    def set_visible(self, visible):
+        self.scene.set_visible(self.base, visible)
+        for joint in self.joints.values():
+            self.scene.set_visible(joint, visible)
 
     def get_default_pose(self):
-        # 返回一个默认的站立姿态
-        return dict(self.cfg.default_pose)
+        # 返回一个默认的站立姿态，配置中未列出的关节为 0
+        default_pose = self.cfg.get("default_pose", {})
+        return {name: float(default_pose.get(name, 0.0)) for name in self.pose_names}
@@ -0,0 +1,200 @@
+import time
+from abc import ABC, abstractmethod
+from collections import Counter
+from typing import NamedTuple
+
+from urdf import load_actuated_joints
+
+
+class SceneBackend(ABC):
+    """
+    场景后端接口。Robot 和 App 只通过这些方法修改场景，
+    返回的 handle 由具体后端定义，调用方只需原样传回。
+    """
+
+    @abstractmethod
+    def add_frame(self, name, position=(0.0, 0.0, 0.0), show_axes=True, axes_length=0.5, axes_radius=0.025):
+        pass
+
+    @abstractmethod
+    def add_box(self, name, dimensions, position=(0.0, 0.0, 0.0), color=(0.8, 0.8, 0.8), opacity=None):
+        pass
+
+    @abstractmethod
+    def add_icosphere(self, name, radius, position=(0.0, 0.0, 0.0), color=(0.8, 0.8, 0.8), opacity=None):
+        pass
+
+    @abstractmethod
+    def add_grid(self, name, width, height, cell_size):
+        pass
+
+    @abstractmethod
+    def add_point_cloud(self, name, points, colors, point_size=0.01):
+        pass
+
+    @abstractmethod
+    def add_urdf(self, urdf_path, root_node_name, mesh_color_override=None):
+        """加载 URDF，返回的 handle 需提供 get_actuated_joint_names()。"""
+
+    @abstractmethod
+    def set_transform(self, handle, position=None, wxyz=None):
+        """后端可以保留 position / wxyz 数组的引用，调用方在下一次 set_transform 之前不能原地修改它们。"""
+
+    @abstractmethod
+    def set_joint_cfg(self, urdf_handle, cfg):
+        pass
+
+    @abstractmethod
+    def set_visible(self, handle, visible):
+        pass
+
+
+class ViserSceneBackend(SceneBackend):
+    def __init__(self, server):
+        self.server = server
+
+    def add_frame(self, name, position=(0.0, 0.0, 0.0), show_axes=True, axes_length=0.5, axes_radius=0.025):
+        return self.server.scene.add_frame(
+            name, position=position, show_axes=show_axes, axes_length=axes_length, axes_radius=axes_radius
+        )
+
+    def add_box(self, name, dimensions, position=(0.0, 0.0, 0.0), color=(0.8, 0.8, 0.8), opacity=None):
+        return self.server.scene.add_box(name, dimensions=dimensions, position=position, color=color, opacity=opacity)
+
+    def add_icosphere(self, name, radius, position=(0.0, 0.0, 0.0), color=(0.8, 0.8, 0.8), opacity=None):
+        return self.server.scene.add_icosphere(name, radius=radius, position=position, color=color, opacity=opacity)
+
+    def add_grid(self, name, width, height, cell_size):
+        return self.server.scene.add_grid(name, width=width, height=height, cell_size=cell_size)
+
+    def add_point_cloud(self, name, points, colors, point_size=0.01):
+        return self.server.scene.add_point_cloud(name, points=points, colors=colors, point_size=point_size)
+
+    def add_urdf(self, urdf_path, root_node_name, mesh_color_override=None):
+        from viser.extras import ViserUrdf
+
+        return ViserUrdf(
+            self.server, urdf_path, root_node_name=root_node_name, mesh_color_override=mesh_color_override
+        )
+
+    def set_transform(self, handle, position=None, wxyz=None):
+        # 直接交给句柄，不复制 (约定见 SceneBackend.set_transform)
+        if position is not None:
+            handle.position = position
+        if wxyz is not None:
+            handle.wxyz = wxyz
+
+    def set_joint_cfg(self, urdf_handle, cfg):
+        urdf_handle.update_cfg(cfg)
+
+    def set_visible(self, handle, visible):
+        handle.visible = visible
+
+
+class SceneNode(NamedTuple):
+    name: str
+
+
+class HeadlessUrdf:
+    """无显示环境下的 URDF 句柄，只解析关节信息。"""
+
+    def __init__(self, urdf_path, root_node_name):
+        self.name = root_node_name
+        self.joints = load_actuated_joints(urdf_path)
+
+    def get_actuated_joint_names(self):
+        return [j["name"] for j in self.joints]
+
+
+class NullSceneBackend(SceneBackend):
+    """不做任何渲染的后端，用于无服务器的批量回放。"""
+
+    def add_frame(self, name, position=(0.0, 0.0, 0.0), show_axes=True, axes_length=0.5, axes_radius=0.025):
+        return SceneNode(name)
+
+    def add_box(self, name, dimensions, position=(0.0, 0.0, 0.0), color=(0.8, 0.8, 0.8), opacity=None):
+        return SceneNode(name)
+
+    def add_icosphere(self, name, radius, position=(0.0, 0.0, 0.0), color=(0.8, 0.8, 0.8), opacity=None):
+        return SceneNode(name)
+
+    def add_grid(self, name, width, height, cell_size):
+        return SceneNode(name)
+
+    def add_point_cloud(self, name, points, colors, point_size=0.01):
+        return SceneNode(name)
+
+    def add_urdf(self, urdf_path, root_node_name, mesh_color_override=None):
+        return HeadlessUrdf(urdf_path, root_node_name)
+
+    def set_transform(self, handle, position=None, wxyz=None):
+        pass
+
+    def set_joint_cfg(self, urdf_handle, cfg):
+        pass
+
+    def set_visible(self, handle, visible):
+        pass
+
+
+class SceneEvent(NamedTuple):
+    timestamp: float  # 相对后端创建时刻的秒数
+    op: str
+    name: str
+    payload: dict
+
+
+class RecordingSceneBackend(NullSceneBackend):
+    """记录每一次场景修改 (带时间戳) 的后端，用于统计一个片段产生的场景消息数。"""
+
+    def __init__(self):
+        self.events = []
+        self._t0 = time.perf_counter()
+
+    def _record(self, op, name, **payload):
+        self.events.append(SceneEvent(time.perf_counter() - self._t0, op, name, payload))
+
+    def add_frame(self, name, position=(0.0, 0.0, 0.0), show_axes=True, axes_length=0.5, axes_radius=0.025):
+        self._record("add_frame", name, position=tuple(position), show_axes=show_axes)
+        return super().add_frame(name, position, show_axes, axes_length, axes_radius)
+
+    def add_box(self, name, dimensions, position=(0.0, 0.0, 0.0), color=(0.8, 0.8, 0.8), opacity=None):
+        self._record("add_box", name, dimensions=tuple(dimensions), position=tuple(position))
+        return super().add_box(name, dimensions, position, color, opacity)
+
+    def add_icosphere(self, name, radius, position=(0.0, 0.0, 0.0), color=(0.8, 0.8, 0.8), opacity=None):
+        self._record("add_icosphere", name, radius=radius, position=tuple(position))
+        return super().add_icosphere(name, radius, position, color, opacity)
+
+    def add_grid(self, name, width, height, cell_size):
+        self._record("add_grid", name, width=width, height=height, cell_size=cell_size)
+        return super().add_grid(name, width, height, cell_size)
+
+    def add_point_cloud(self, name, points, colors, point_size=0.01):
+        self._record("add_point_cloud", name, num_points=len(points))
+        return super().add_point_cloud(name, points, colors, point_size)
+
+    def add_urdf(self, urdf_path, root_node_name, mesh_color_override=None):
+        self._record("add_urdf", root_node_name, urdf_path=str(urdf_path))
+        return super().add_urdf(urdf_path, root_node_name, mesh_color_override)
+
+    def set_transform(self, handle, position=None, wxyz=None):
+        # viser 中位置和朝向是两条独立的消息，这里也分开记录
+        if position is not None:
+            self._record("set_position", handle.name, position=tuple(float(v) for v in position))
+        if wxyz is not None:
+            self._record("set_wxyz", handle.name, wxyz=tuple(float(v) for v in wxyz))
+
+    def set_joint_cfg(self, urdf_handle, cfg):
+        self._record("set_joint_cfg", urdf_handle.name, cfg=tuple(float(v) for v in cfg))
+
+    def set_visible(self, handle, visible):
+        self._record("set_visible", handle.name, visible=visible)
+
+    def counts(self):
+        """按操作类型统计的消息数。"""
+        return Counter(e.op for e in self.events)
+
+    def clear(self):
+        self.events = []
+        self._t0 = time.perf_counter()
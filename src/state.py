@@ -0,0 +1,86 @@
+import threading
+from dataclasses import dataclass, replace
+from types import MappingProxyType
+
+
+@dataclass(frozen=True)
+class AppState:
+    """
+    应用状态的一个不可变快照。
+    pose 为只读映射，base_pos / base_rpy 为元组，任何修改都会生成新快照。
+    """
+
+    pose: MappingProxyType
+    base_pos: tuple = (0.0, 0.0, 0.4)
+    base_rpy: tuple = (0.0, 0.0, 0.0)
+    playing: bool = False
+    time: float = 0.0
+    speed: float = 1.0
+    loop: bool = True
+    duration: float = 2.0
+    tick_time: float = 0.0  # time 最近一次被写入时的墙钟时间，用于外推播放时间
+    version: int = 0
+
+
+def _freeze(changes):
+    if "pose" in changes:
+        changes["pose"] = MappingProxyType(dict(changes["pose"]))
+    for key in ("base_pos", "base_rpy"):
+        if key in changes:
+            changes[key] = tuple(float(v) for v in changes[key])
+    return changes
+
+
+class StateStore:
+    """
+    版本化的写时复制状态存储。
+
+    读者 (渲染循环、流输出线程) 通过 snapshot() 直接拿到当前快照的引用，不加锁，
+    并且总能看到一帧完整一致的状态。写者 (viser 回调、播放循环) 在一把只在写者之间
+    竞争的短锁内基于最新快照生成新快照并整体替换引用，因此永远不会阻塞读者。
+    """
+
+    def __init__(self, pose, **fields):
+        self._front = AppState(**_freeze(dict(fields, pose=pose)))
+        self._write_lock = threading.Lock()
+
+    def snapshot(self):
+        return self._front
+
+    @property
+    def version(self):
+        return self._front.version
+
+    def update(self, expected_version=None, **changes):
+        """
+        发布一组字段修改，返回新快照。
+        若给定 expected_version 且期间已有其他写者发布过，则放弃本次修改并返回 None。
+        """
+        changes = _freeze(changes)
+        with self._write_lock:
+            current = self._front
+            if expected_version is not None and current.version != expected_version:
+                return None
+            self._front = replace(current, version=current.version + 1, **changes)
+            return self._front
+
+    def update_pose(self, pose):
+        """合并部分关节角 (其余关节保持不变)。"""
+        with self._write_lock:
+            current = self._front
+            merged = dict(current.pose)
+            merged.update(pose)
+            self._front = replace(current, version=current.version + 1, pose=MappingProxyType(merged))
+            return self._front
+
+    def set_joint(self, name, value):
+        return self.update_pose({name: value})
+
+    def set_base_component(self, field, index, value):
+        """修改 base_pos 或 base_rpy 的单个分量。"""
+        with self._write_lock:
+            current = self._front
+            values = list(getattr(current, field))
+            values[index] = float(value)
+            self._front = replace(current, version=current.version + 1, **{field: tuple(values)})
+            return self._front
@@ -0,0 +1,245 @@
+import json
+import os
+import shutil
+import socket
+import struct
+import tempfile
+import threading
+import time
+
+import numpy as np
+from rich import print
+from scipy.spatial.transform import Rotation as R
+
+from animator import ClipSamples
+
+
+# 数据包格式 (小端):
+#   header: magic(4s) version(B) kind(B) count(H) seq(I) send_time(d) clip_time(d)
+#   kind == PACKET_STATE: base_pos(3f) base_wxyz(4f) joints(count * f)
+#   kind == PACKET_NAMES: count 个关节名，以 UTF-8 JSON 数组编码
+PACKET_MAGIC = b"RKPT"
+PACKET_VERSION = 1
+PACKET_STATE = 0
+PACKET_NAMES = 1
+HEADER = struct.Struct("<4sBBHIdd")
+BASE = struct.Struct("<7f")
+
+
+def encode_state(seq, send_time, clip_time, base_pos, base_wxyz, joints):
+    joints = np.asarray(joints, dtype="<f4")
+    header = HEADER.pack(PACKET_MAGIC, PACKET_VERSION, PACKET_STATE, len(joints), seq, send_time, clip_time)
+    return header + BASE.pack(*base_pos, *base_wxyz) + joints.tobytes()
+
+
+def encode_names(seq, send_time, joint_names):
+    header = HEADER.pack(PACKET_MAGIC, PACKET_VERSION, PACKET_NAMES, len(joint_names), seq, send_time, 0.0)
+    return header + json.dumps(list(joint_names)).encode("utf-8")
+
+
+def decode_packet(data):
+    """
+    Returns: dict，state 包含 base_pos / base_wxyz / joints，names 包含 joint_names
+    """
+    magic, version, kind, count, seq, send_time, clip_time = HEADER.unpack_from(data)
+    if magic != PACKET_MAGIC or version != PACKET_VERSION:
+        raise ValueError("Not a pose stream packet")
+
+    packet = {"kind": kind, "seq": seq, "send_time": send_time, "clip_time": clip_time}
+    if kind == PACKET_NAMES:
+        packet["joint_names"] = json.loads(data[HEADER.size :].decode("utf-8"))
+    else:
+        base = BASE.unpack_from(data, HEADER.size)
+        packet["base_pos"] = np.array(base[:3])
+        packet["base_wxyz"] = np.array(base[3:])
+        packet["joints"] = np.frombuffer(data, dtype="<f4", count=count, offset=HEADER.size + BASE.size)
+    return packet
+
+
+def _make_socket(transport):
+    if transport == "udp":
+        return socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    if transport == "unix":
+        return socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    raise ValueError(f"Unknown transport: {transport}")
+
+
+class PoseStreamer:
+    """
+    在独立计时线程上以固定频率发送插值后的关节目标和基座位姿，与 GUI 主循环解耦。
+    sample_fn: t -> ClipSamples (单个采样)
+    time_fn: () -> 当前片段时间
+    address: udp 为 (host, port)，unix 为 socket 文件路径
+    """
+
+    # 关节名表的重发间隔，方便接收端中途加入
+    NAMES_INTERVAL = 1.0
+    # 采样失败时打印错误的最短间隔，避免 500 Hz 刷屏
+    ERROR_LOG_INTERVAL = 5.0
+
+    def __init__(self, sample_fn, time_fn, address, transport="udp", rate=500.0):
+        self.sample_fn = sample_fn
+        self.time_fn = time_fn
+        self.address = tuple(address) if transport == "udp" else address
+        self.transport = transport
+        self.rate = rate
+
+        self.sent = 0
+        self.dropped = 0
+        self._seq = 0
+        self._joint_names = None
+        self._names_sent_at = 0.0
+        self._error_logged_at = None
+        self._errors_since_log = 0
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="pose-streamer", daemon=True)
+        self._thread.start()
+        print(f"[green]Streaming joint targets to {self.address} at {self.rate:.0f} Hz[/green]")
+
+    def stop(self):
+        if not self.running:
+            return
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+        print("[yellow]Stopped joint target stream[/yellow]")
+
+    def _send(self, sock, packet):
+        try:
+            sock.sendto(packet, self.address)
+            self.sent += 1
+        except OSError:
+            # 接收端未启动时 UDP/Unix socket 会报错，丢弃该包继续计时
+            self.dropped += 1
+        self._seq = (self._seq + 1) & 0xFFFFFFFF
+
+    def _log_error(self, error):
+        """第一次失败立即打印，之后每 ERROR_LOG_INTERVAL 秒最多打印一次，并附上期间被略去的次数。"""
+        self._errors_since_log += 1
+        now = time.perf_counter()
+        if self._error_logged_at is not None and now - self._error_logged_at < self.ERROR_LOG_INTERVAL:
+            return
+        suppressed = self._errors_since_log - 1
+        more = f" ({suppressed} more since last report)" if suppressed else ""
+        print(f"[red]Pose stream sample failed: {error!r}{more}[/red]")
+        self._error_logged_at = now
+        self._errors_since_log = 0
+
+    def _publish(self, sock, s, clip_time):
+        now = time.perf_counter()
+        if s.joint_names != self._joint_names or now - self._names_sent_at > self.NAMES_INTERVAL:
+            self._joint_names = s.joint_names
+            self._names_sent_at = now
+            self._send(sock, encode_names(self._seq, time.time(), s.joint_names))
+
+        x, y, z, w = s.base_rot[0].as_quat()
+        self._send(sock, encode_state(self._seq, time.time(), clip_time, s.base_pos[0], (w, x, y, z), s.joints[0]))
+
+    def _run(self):
+        period = 1.0 / self.rate
+        sock = _make_socket(self.transport)
+        self._joint_names = None
+        self._names_sent_at = 0.0
+        self._error_logged_at = None
+        self._errors_since_log = 0
+        deadline = time.perf_counter()
+
+        try:
+            while not self._stop_event.is_set():
+                clip_time = self.time_fn()
+                try:
+                    self._publish(sock, self.sample_fn(clip_time), clip_time)
+                except Exception as e:
+                    # 片段正在被编辑 (关键帧增删) 时可能短暂不一致，跳过这一拍
+                    self.dropped += 1
+                    self._log_error(e)
+
+                # 绝对截止时间调度，避免误差累积；落后超过一个周期时直接跳过错过的节拍
+                deadline += period
+                remaining = deadline - time.perf_counter()
+                if remaining > 0:
+                    self._stop_event.wait(remaining)
+                elif remaining < -period:
+                    deadline = time.perf_counter()
+        finally:
+            sock.close()
+
+
+class PoseReceiver:
+    """用于回环测试或简单桥接的接收端。"""
+
+    def __init__(self, address, transport="udp"):
+        self.transport = transport
+        self.sock = _make_socket(transport)
+        self.sock.bind(tuple(address) if transport == "udp" else address)
+        self.joint_names = []
+
+    @property
+    def address(self):
+        return self.sock.getsockname()
+
+    def receive(self, timeout=1.0):
+        """接收下一个 state 包 (names 包会被自动吸收)；超时返回 None。"""
+        self.sock.settimeout(timeout)
+        while True:
+            try:
+                data, _ = self.sock.recvfrom(65536)
+            except socket.timeout:
+                return None
+            packet = decode_packet(data)
+            if packet["kind"] == PACKET_NAMES:
+                self.joint_names = packet["joint_names"]
+                continue
+            packet["joint_names"] = self.joint_names
+            return packet
+
+    def close(self):
+        self.sock.close()
+
+
+def loopback_check(transport="udp", timeout=2.0):
+    """
+    在本机回环上检查 PoseStreamer -> PoseReceiver 的完整链路: 收到的包解码后关节名、关节值、基座位姿和片段时间
+    与发送时一致，不一致时抛出 AssertionError。
+    udp 绑定 ("127.0.0.1", 0) 由系统分配端口，unix 使用临时目录下的 socket 文件。
+    """
+    names = ["FL_hip", "FL_thigh", "FL_calf"]
+    joints = np.array([0.1, -0.7, 1.4])
+    base_pos = np.array([0.5, -0.25, 0.3])
+    base_rot = R.from_euler("xyz", [0.05, -0.1, 0.3])
+    sample = ClipSamples(names, joints[None, :], base_pos[None, :], R.from_quat(base_rot.as_quat()[None, :]))
+
+    tmp_dir = tempfile.mkdtemp() if transport == "unix" else None
+    receiver = PoseReceiver(("127.0.0.1", 0) if transport == "udp" else os.path.join(tmp_dir, "pose.sock"), transport)
+    streamer = PoseStreamer(lambda t: sample, lambda: 1.25, receiver.address, transport, rate=100.0)
+    try:
+        streamer.start()
+        packet = receiver.receive(timeout)
+        assert packet is not None, f"{transport}: no packet received"
+        assert packet["joint_names"] == names, f"{transport}: joint names {packet['joint_names']}"
+        assert np.allclose(packet["joints"], joints, atol=1e-6), f"{transport}: joints {packet['joints']}"
+        assert np.allclose(packet["base_pos"], base_pos, atol=1e-6), f"{transport}: base_pos {packet['base_pos']}"
+        x, y, z, w = base_rot.as_quat()
+        assert np.allclose(packet["base_wxyz"], (w, x, y, z), atol=1e-6), f"{transport}: wxyz {packet['base_wxyz']}"
+        assert packet["clip_time"] == 1.25, f"{transport}: clip_time {packet['clip_time']}"
+    finally:
+        streamer.stop()
+        receiver.close()
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    for transport in ("udp", "unix"):
+        loopback_check(transport)
+        print(f"[green]{transport} loopback OK[/green]")
@@ -0,0 +1,183 @@
+import copy
+import re
+from typing import NamedTuple
+
+import numpy as np
+
+from animator import BASE_CHANNELS, Animator
+
+# 左右镜像时需取反的基座分量: 位置 y，旋转 roll / yaw
+BASE_POS_MIRROR = np.array([1.0, -1.0, 1.0])
+BASE_RPY_MIRROR = np.array([-1.0, 1.0, -1.0])
+
+# 腿名前缀 (如 FL / RR) 中第二个字母表示左右
+SIDE_PATTERN = re.compile(r"^([FR])([LR])(_|$)")
+
+SIDES = {
+    "left": ("FL", "RL"),
+    "right": ("FR", "RR"),
+    "front": ("FL", "FR"),
+    "rear": ("RL", "RR"),
+}
+
+
+class KeyframeMatrix(NamedTuple):
+    """整段片段的关键帧矩阵，所有片段级变换都在这些数组上一次完成。"""
+
+    times: np.ndarray  # (K,) 源时间
+    joint_names: list  # (J,)
+    joints: np.ndarray  # (K, J)
+    base_pos: np.ndarray  # (K, 3)
+    base_rpy: np.ndarray  # (K, 3)
+    tangents: np.ndarray  # (K, J + 3, 2) hermite 入/出切线 (未指定为 NaN)，通道为关节 + BASE_CHANNELS
+
+
+def to_matrix(animator):
+    names = animator.joint_names
+    channels = names + BASE_CHANNELS
+    keyframes = animator.keyframes
+    tangents = np.full((len(keyframes), len(channels), 2), np.nan)
+    for i, k in enumerate(keyframes):
+        for name, tangent in k.get("tangents", {}).items():
+            if name in channels:
+                pair = tangent if isinstance(tangent, (list, tuple)) else (tangent, tangent)
+                tangents[i, channels.index(name)] = pair
+    joints = np.array([[k["pose"][name] for name in names] for k in keyframes], dtype=float)
+    return KeyframeMatrix(
+        np.array([k["time"] for k in keyframes], dtype=float),
+        names,
+        joints.reshape(len(keyframes), len(names)),
+        np.array([k["base"]["pos"] for k in keyframes], dtype=float).reshape(-1, 3),
+        np.array([k["base"]["rpy"] for k in keyframes], dtype=float).reshape(-1, 3),
+        tangents,
+    )
+
+
+def from_matrix(animator, m):
+    """由关键帧矩阵生成新的 Animator，时长、插值方式和时间扭曲沿用 animator。"""
+    result = Animator()
+    result.duration = animator.duration
+    result.interpolation_method = animator.interpolation_method
+    result.time_warp = copy.deepcopy(animator.time_warp)
+
+    channels = m.joint_names + BASE_CHANNELS
+    order = np.argsort(m.times, kind="stable")
+    for i in order:
+        keyframe = {
+            "time": float(m.times[i]),
+            "pose": dict(zip(m.joint_names, m.joints[i].tolist())),
+            "base": {"pos": m.base_pos[i].tolist(), "rpy": m.base_rpy[i].tolist()},
+        }
+        specified = ~np.isnan(m.tangents[i, :, 0])
+        if specified.any():
+            keyframe["tangents"] = {channels[c]: m.tangents[i, c].tolist() for c in np.flatnonzero(specified)}
+        result.keyframes.append(keyframe)
+    result.needs_update = True
+    return result
+
+
+def mirror_name(name):
+    """FL_hip -> FR_hip；没有左右前缀的关节名保持不变。"""
+    return SIDE_PATTERN.sub(lambda g: g.group(1) + ("R" if g.group(2) == "L" else "L") + g.group(3), name)
+
+
+def mirror_signs(joint_names, joint_axes=None):
+    """
+    关于矢状面 (y -> -y) 镜像后各关节角的符号。
+    绕轴 a 转 θ 镜像后变为绕 M·a 转 -θ (M = diag(1, -1, 1))，对侧关节轴为 b 时角度为 -(b · M·a) θ。
+    joint_axes: {name: (x, y, z)}；缺省时按四足惯例 hip 取反，其余保持。
+    """
+    signs = np.ones(len(joint_names))
+    for i, name in enumerate(joint_names):
+        if joint_axes is not None and name in joint_axes and mirror_name(name) in joint_axes:
+            a = np.asarray(joint_axes[name], dtype=float) * BASE_POS_MIRROR
+            b = np.asarray(joint_axes[mirror_name(name)], dtype=float)
+            signs[i] = -np.sign(np.dot(a, b)) or 1.0
+        elif name.endswith("_hip"):
+            signs[i] = -1.0
+    return signs
+
+
+def mirror(animator, joint_axes=None):
+    """整段左右镜像: 左右关节互换并按旋转轴修正符号，基座 y / roll / yaw 取反。"""
+    m = to_matrix(animator)
+    names = m.joint_names
+    index = {name: i for i, name in enumerate(names)}
+    source = np.array([index.get(mirror_name(name), i) for i, name in enumerate(names)], dtype=int)
+    signs = mirror_signs(names, joint_axes)
+
+    tangents = m.tangents.copy()
+    tangents[:, : len(names)] = m.tangents[:, source] * signs[None, :, None]
+    tangents[:, len(names) :] *= BASE_POS_MIRROR[None, :, None]
+    return from_matrix(
+        animator,
+        m._replace(
+            joints=m.joints[:, source] * signs,
+            base_pos=m.base_pos * BASE_POS_MIRROR,
+            base_rpy=m.base_rpy * BASE_RPY_MIRROR,
+            tangents=tangents,
+        ),
+    )
+
+
+def reverse(animator):
+    """时间倒放: 关键帧时间 t -> S - t，切线取反并交换入/出，时间扭曲一并倒置。"""
+    m = to_matrix(animator)
+    if animator.time_warp is not None:
+        play, src = animator.time_warp
+        span = src[0] + src[-1]
+    else:
+        span = animator.duration
+
+    result = from_matrix(animator, m._replace(times=span - m.times, tangents=-m.tangents[..., ::-1]))
+    if animator.time_warp is not None:
+        result.time_warp = (play[0] + play[-1] - play[::-1], span - src[::-1])
+    return result
+
+
+def phase_shift(animator, legs, shift=0.5, period=None):
+    """
+    把 legs (如 SIDES["right"]) 上的关节在时间上平移 shift 个步态周期，例如把 trot 变为 bound / pace。
+    片段视为首尾相接的循环 (时长为周期的整数倍)，period 默认为整段时长。
+    结果在原关键帧与平移后关键帧时刻的并集上重新取样；平移通道的切线无法保留，因此所有切线都会被丢弃。
+    """
+    m = to_matrix(animator)
+    length = animator.duration
+    offset = shift * (length if period is None else period)
+    shifted = np.array([any(name.startswith(f"{leg}_") for leg in legs) for name in m.joint_names])
+
+    times = np.unique(np.concatenate([m.times, (m.times - offset) % length]))
+    times = times[(times >= 0.0) & (times <= length)]
+    times = times[np.concatenate([[True], np.diff(times) > 1e-9])]  # 合并浮点误差造成的重复时刻
+    # 关键帧时间是源时间，取样需要播放时间
+    base = animator.sample(animator.unwarp_time(times))
+    moved = animator.sample(animator.unwarp_time((times + offset) % length))
+
+    joints = np.where(shifted, moved.joints, base.joints)
+    return from_matrix(
+        animator,
+        KeyframeMatrix(
+            times,
+            base.joint_names,
+            joints,
+            base.base_pos,
+            base.base_rot.as_euler("xyz", degrees=False),
+            np.full((len(times), len(base.joint_names) + 3, 2), np.nan),
+        ),
+    )
+
+
+def offset_scale(animator, joint_names, offset=0.0, scale=1.0, about_mean=True):
+    """
+    对选中关节整段做 value * scale + offset。
+    about_mean: 以每个关节在关键帧上的均值为中心缩放 (只放大 / 缩小运动幅度，不移动中心)
+    """
+    m = to_matrix(animator)
+    cols = [i for i, name in enumerate(m.joint_names) if name in set(joint_names)]
+    joints = m.joints.copy()
+    pivot = joints[:, cols].mean(axis=0) if about_mean and len(joints) else 0.0
+    joints[:, cols] = (joints[:, cols] - pivot) * scale + pivot + offset
+
+    tangents = m.tangents.copy()
+    tangents[:, cols] *= scale
+    return from_matrix(animator, m._replace(joints=joints, tangents=tangents))
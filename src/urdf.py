@@ -0,0 +1,39 @@
+import xml.etree.ElementTree as ET
+
+
+def load_actuated_joints(urdf_path):
+    """
+    解析 URDF 中的可驱动关节 (非 fixed 且非 mimic)，顺序与文件中声明顺序一致，
+    即与 ViserUrdf.get_actuated_joint_names() 的顺序一致。
+
+    Returns: [{"name", "type", "parent", "child", "axis", "limit"}, ...]
+        axis 为 (x, y, z)，limit 为 (lower, upper) 或 None
+    """
+    root = ET.parse(urdf_path).getroot()
+    joints = []
+    for joint in root.findall("joint"):
+        joint_type = joint.get("type", "fixed")
+        if joint_type == "fixed" or joint.find("mimic") is not None:
+            continue
+
+        axis_elem = joint.find("axis")
+        axis = (1.0, 0.0, 0.0)
+        if axis_elem is not None and axis_elem.get("xyz"):
+            axis = tuple(float(v) for v in axis_elem.get("xyz").split())
+
+        limit = None
+        limit_elem = joint.find("limit")
+        if limit_elem is not None and limit_elem.get("lower") is not None and limit_elem.get("upper") is not None:
+            limit = (float(limit_elem.get("lower")), float(limit_elem.get("upper")))
+
+        joints.append(
+            {
+                "name": joint.get("name"),
+                "type": joint_type,
+                "parent": joint.find("parent").get("link"),
+                "child": joint.find("child").get("link"),
+                "axis": axis,
+                "limit": limit,
+            }
+        )
+    return joints